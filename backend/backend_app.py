@@ -1,17 +1,24 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
+import json
 import logging
+import queue
 import re
-import whisper
 import os
+import threading
 from urllib.parse import urlparse
-from quiz_pipeline.video_processing import extract_audio_from_url
-from quiz_pipeline.pdf_processing import extract_text_from_pdf
-from quiz_pipeline.transcription import transcribe_audio
-from quiz_pipeline.quiz_generation import generate_quiz_with_gemini, parse_quiz_text
-from quiz_pipeline.keypoint_extraction import extract_keypoints_improved
-from quiz_pipeline.os_video_handler import process_local_path 
+from quiz_pipeline.pipeline import process_url, process_pdf, process_pdf_file, process_local_source
+from quiz_pipeline.batch import run_batch
+from quiz_pipeline.keypoint_extraction import KEYPOINT_TIERS
+from quiz_pipeline.jobs import get_job_manager, JobQueueFull, JobNotRetryable
+from quiz_pipeline.workspace import Workspace, ephemeral_workspace, sweep_workspaces
+from quiz_pipeline.cache import get_cache
+from quiz_pipeline.pdf_processing import spool_upload, PdfLimitError
+from quiz_pipeline.model_registry import warm_up, start_warm_up, readiness, model_stats
+from quiz_pipeline.metrics import collect_trace, render_prometheus
+from quiz_pipeline.config import (PRELOAD_MODELS, READY_MODELS, PRELOAD_IN_BACKGROUND, SSE_KEEPALIVE_SECONDS,
+                                  BATCH_MAX_SOURCES)
 load_dotenv()
 
 def is_local_path(path: str) -> bool:
@@ -27,12 +34,15 @@ app = Flask(__name__)
 CORS(app)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-try:
-    whisper_model = whisper.load_model('base')
-    logging.info("Whisper model loaded successfully.")
-except Exception as e:
-    logging.critical(f"Failed to load Whisper model: {e}", exc_info=True)
-    whisper_model = None
+# workspaces left behind by earlier processes that crashed or were recycled mid-run
+sweep_workspaces()
+
+if PRELOAD_MODELS:
+    logging.info(f"Warming up models: {', '.join(PRELOAD_MODELS)}")
+    if PRELOAD_IN_BACKGROUND:
+        start_warm_up(PRELOAD_MODELS)
+    else:
+        warm_up(PRELOAD_MODELS)
 
 def is_url(string):
     try:
@@ -41,10 +51,83 @@ def is_url(string):
     except ValueError:
         return False
 
+@app.route('/api/models', methods=['GET'])
+def handle_model_stats():
+    return jsonify(model_stats())
+
+@app.route('/api/health', methods=['GET'])
+def handle_health():
+    # liveness: the process is up and serving, whatever the state of the models
+    return jsonify({"status": "up", "pid": os.getpid()})
+
+@app.route('/api/ready', methods=['GET'])
+def handle_ready():
+    # readiness: every model in READY_MODELS is loaded
+    state = readiness(READY_MODELS)
+    state["status"] = "ready" if state["ready"] else "warming" if state["warming"] else "not_ready"
+    return jsonify(state), 200 if state["ready"] else 503
+
+def is_truthy(flag):
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+def wants_async(data=None):
+    flag = request.args.get('async')
+    if flag is None and data is not None:
+        flag = data.get('async')
+    return is_truthy(flag)
+
+def wants_trace(data=None):
+    flag = request.args.get('trace')
+    if flag is None and data is not None:
+        flag = data.get('trace')
+    return is_truthy(flag)
+
+def keypoint_tier(data=None):
+    tier = request.args.get('tier')
+    if tier is None and data is not None:
+        tier = data.get('tier')
+    return str(tier).strip().lower() if tier else None
+
+def tier_error(tier):
+    if tier is None or tier in KEYPOINT_TIERS:
+        return None
+    return jsonify({"error": f"Unknown key-point tier '{tier}'. Use one of: {', '.join(KEYPOINT_TIERS)}."}), 400
+
+def run_pipeline(fn, *args, trace=False, **kwargs):
+    # a request cannot be retried, so its workspace only lives as long as the request
+    with collect_trace() as collected, ephemeral_workspace():
+        result = fn(*args, **kwargs)
+    if trace:
+        result = dict(result, trace=collected.as_dict())
+    return result
+
+def queue_full(e):
+    response = jsonify({"error": str(e)})
+    response.headers['Retry-After'] = '30'
+    return response, 429
+
+def job_links(job_id, status="queued"):
+    return jsonify({
+        "job_id": job_id,
+        "status": status,
+        "status_url": f"/api/jobs/{job_id}",
+        "result_url": f"/api/jobs/{job_id}/result",
+    }), 202
+
+def submit_job(fn, *args, source_name=None, on_finish=None, workspace=None, **kwargs):
+    try:
+        job_id = get_job_manager().submit(fn, *args, source_name=source_name, on_finish=on_finish,
+                                          workspace=workspace, **kwargs)
+    except JobQueueFull as e:
+        if on_finish is not None:
+            on_finish()
+        return queue_full(e)
+    return job_links(job_id)
+
 @app.route('/api/generate-quiz', methods=['POST'])
 def handle_quiz_generation():
     app.logger.info("API endpoint hit: /api/generate-quiz")
-    content_type = request.content_type
+    content_type = request.content_type or ''
     try:
         if 'application/json' in content_type:
             data = request.get_json()
@@ -52,6 +135,10 @@ def handle_quiz_generation():
                 return jsonify({"error": "Request must contain a 'source' key in the JSON body."}), 400
 
             source = data['source'].strip()
+            regenerate = is_truthy(data.get('regenerate'))
+            tier = keypoint_tier(data)
+            if tier_error(tier):
+                return tier_error(tier)
             
             if not is_url(source):
                 app.logger.info(f"Processing as a local path: {source}")
@@ -59,7 +146,12 @@ def handle_quiz_generation():
                 if not os.path.exists(source):
                     return jsonify({"error": f"Path does not exist on the server: {source}"}), 404
 
-                result = process_local_path(source)
+                if wants_async(data):
+                    return submit_job(process_local_source, source, source_name=source, regenerate=regenerate,
+                                      tier=tier)
+
+                result = run_pipeline(process_local_source, source, trace=wants_trace(data), regenerate=regenerate,
+                                      tier=tier)
                 
                 if 'error' in result:
                     return jsonify(result), 400
@@ -68,22 +160,12 @@ def handle_quiz_generation():
             else:
                 app.logger.info(f"Processing as a URL: {source}")
 
-                audio_file = extract_audio_from_url(source)
-                if not audio_file:
-                    return jsonify({"error": "Failed to download or extract audio from URL."}), 400
-
-                transcribed_text = transcribe_audio(audio_file, whisper_model)
-                if not transcribed_text:
-                    return jsonify({"error": "Transcription failed for the URL."}), 400
-
-                key_points = extract_keypoints_improved(transcribed_text)
-                if not key_points:
-                    return jsonify({"error": "Key point extraction failed."}), 400
+                if wants_async(data):
+                    return submit_job(process_url, source, source_name=source, regenerate=regenerate, tier=tier)
 
-                quiz_raw = generate_quiz_with_gemini("\n- ".join(key_points))
-                mcq, tf = parse_quiz_text(quiz_raw)
-                
-                result = {"source_name": source, "quiz_data": mcq + tf}
+                result = run_pipeline(process_url, source, trace=wants_trace(data), regenerate=regenerate, tier=tier)
+                if 'error' in result:
+                    return jsonify(result), 400
                 return jsonify([result])
 
         elif 'multipart/form-data' in content_type:
@@ -92,12 +174,26 @@ def handle_quiz_generation():
                 return jsonify({"error": "Missing 'file' in form-data"}), 400
             
             file = request.files['file']
+            regenerate = is_truthy(request.form.get('regenerate'))
+            tier = keypoint_tier(request.form)
+            if tier_error(tier):
+                return tier_error(tier)
             if file and file.filename.lower().endswith('.pdf'):
-                text = extract_text_from_pdf(file.stream)
-                key_points = extract_keypoints_improved(text)
-                quiz_raw = generate_quiz_with_gemini("\n- ".join(key_points))
-                mcq, tf = parse_quiz_text(quiz_raw)
-                result = {"source_name": file.filename, "quiz_data": mcq + tf}
+                if wants_async(request.form):
+                    # the upload stream dies with the request, so the job reads a copy kept in its workspace
+                    workspace = Workspace.create()
+                    try:
+                        pdf_path = spool_upload(file.stream, directory=workspace.subdir("uploads"))
+                    except BaseException:
+                        workspace.remove()
+                        raise
+                    return submit_job(process_pdf_file, pdf_path, file.filename, source_name=file.filename,
+                                      workspace=workspace, regenerate=regenerate, tier=tier)
+
+                result = run_pipeline(process_pdf, file.stream, file.filename, trace=wants_trace(request.form),
+                                      regenerate=regenerate, tier=tier)
+                if 'error' in result:
+                    return jsonify(result), 400
                 return jsonify([result])
             else:
                 return jsonify({"error": "Invalid file type. Please upload a PDF."}), 400
@@ -105,12 +201,224 @@ def handle_quiz_generation():
         else:
             return jsonify({"error": f"Unsupported Content-Type: {content_type}"}), 415
         
+    except PdfLimitError as e:
+        return jsonify({"error": str(e)}), 413
     except Exception as e:
         app.logger.error(f"An unhandled error occurred: {e}", exc_info=True)
         return jsonify({"error": "An internal server error occurred."}), 500
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_pipeline(fn, *args, on_finish=None, trace=False, as_list=True, **kwargs):
+    # the pipeline runs on its own thread and pushes events here; the response drains them as they arrive
+    events = queue.Queue()
+
+    def progress(stage, status, **data):
+        events.put(("item" if status == "item" else "stage", dict(data, stage=stage, status=status)))
+
+    def run():
+        try:
+            result = run_pipeline(fn, *args, trace=trace, progress=progress, **kwargs)
+            if 'error' in result:
+                events.put(("error", result))
+            else:
+                events.put(("result", [result] if as_list else result))
+        except PdfLimitError as e:
+            events.put(("error", {"error": str(e)}))
+        except Exception as e:
+            app.logger.error(f"Streaming pipeline failed: {e}", exc_info=True)
+            events.put(("error", {"error": "An internal server error occurred."}))
+        finally:
+            if on_finish is not None:
+                on_finish()
+            events.put(None)
+
+    threading.Thread(target=run, name="quiz-stream", daemon=True).start()
+
+    def generate():
+        while True:
+            try:
+                message = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # keeps proxies from closing an idle connection during long stages
+                yield ": keep-alive\n\n"
+                continue
+            if message is None:
+                yield sse_event("done", {})
+                return
+            yield sse_event(*message)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/generate-quiz/stream', methods=['POST'])
+def handle_quiz_stream():
+    app.logger.info("API endpoint hit: /api/generate-quiz/stream")
+    content_type = request.content_type or ''
+    if 'application/json' in content_type:
+        data = request.get_json()
+        if not data or 'source' not in data:
+            return jsonify({"error": "Request must contain a 'source' key in the JSON body."}), 400
+        source = data['source'].strip()
+        regenerate = is_truthy(data.get('regenerate'))
+        tier = keypoint_tier(data)
+        if tier_error(tier):
+            return tier_error(tier)
+        if is_url(source):
+            return stream_pipeline(process_url, source, trace=wants_trace(data), regenerate=regenerate, tier=tier)
+        if not os.path.exists(source):
+            return jsonify({"error": f"Path does not exist on the server: {source}"}), 404
+        return stream_pipeline(process_local_source, source, trace=wants_trace(data), regenerate=regenerate,
+                               tier=tier)
+
+    elif 'multipart/form-data' in content_type:
+        file = request.files.get('file')
+        if file is None:
+            return jsonify({"error": "Missing 'file' in form-data"}), 400
+        if not file.filename.lower().endswith('.pdf'):
+            return jsonify({"error": "Invalid file type. Please upload a PDF."}), 400
+        tier = keypoint_tier(request.form)
+        if tier_error(tier):
+            return tier_error(tier)
+        try:
+            pdf_path = spool_upload(file.stream)
+        except PdfLimitError as e:
+            return jsonify({"error": str(e)}), 413
+        return stream_pipeline(process_pdf_file, pdf_path, file.filename, on_finish=lambda: os.remove(pdf_path),
+                               trace=wants_trace(request.form), regenerate=is_truthy(request.form.get('regenerate')),
+                               tier=tier)
+
+    return jsonify({"error": f"Unsupported Content-Type: {content_type}"}), 415
+
+def batch_items(sources, files):
+    # returns (items, error response); local paths are checked up front like on the single-source routes
+    items = []
+    for source in sources:
+        source = str(source).strip()
+        if is_url(source):
+            items.append({"kind": "url", "source": source})
+        elif os.path.exists(source):
+            items.append({"kind": "path", "source": source})
+        else:
+            return None, (jsonify({"error": f"Path does not exist on the server: {source}"}), 404)
+    for file in files:
+        if not file.filename.lower().endswith('.pdf'):
+            return None, (jsonify({"error": f"Invalid file type: {file.filename}. Please upload PDFs."}), 400)
+        items.append({"kind": "pdf", "source": file.filename})
+    if not items:
+        return None, (jsonify({"error": "Request must contain a non-empty 'sources' list or PDF 'files'."}), 400)
+    if len(items) > BATCH_MAX_SOURCES:
+        return None, (jsonify({"error": f"Too many sources ({len(items)}/{BATCH_MAX_SOURCES})."}), 413)
+    return items, None
+
+@app.route('/api/generate-quiz/batch', methods=['POST'])
+def handle_quiz_batch():
+    app.logger.info("API endpoint hit: /api/generate-quiz/batch")
+    content_type = request.content_type or ''
+    if 'application/json' in content_type:
+        data = request.get_json()
+        sources = data.get('sources') if isinstance(data, dict) else None
+        if not isinstance(sources, list):
+            return jsonify({"error": "Request must contain a 'sources' list in the JSON body."}), 400
+        files = []
+    elif 'multipart/form-data' in content_type:
+        data = request.form
+        sources = request.form.getlist('sources')
+        files = request.files.getlist('files')
+    else:
+        return jsonify({"error": f"Unsupported Content-Type: {content_type}"}), 415
+
+    items, error = batch_items(sources, files)
+    if error:
+        return error
+    tier = keypoint_tier(data)
+    if tier_error(tier):
+        return tier_error(tier)
+
+    # uploads die with the request, so every pdf is spooled to a private copy the batch can read later;
+    # a job keeps its copies in its workspace so a retry still has them
+    workspace = Workspace.create() if wants_async(data) else None
+    spooled = []
+    def remove_spooled():
+        for path in spooled:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    try:
+        for item, file in zip([item for item in items if item["kind"] == "pdf"], files):
+            item["path"] = spool_upload(file.stream, directory=workspace.subdir("uploads") if workspace else None)
+            spooled.append(item["path"])
+    except PdfLimitError as e:
+        remove_spooled()
+        if workspace is not None:
+            workspace.remove()
+        return jsonify({"error": str(e)}), 413
+
+    regenerate = is_truthy(data.get('regenerate'))
+    if workspace is not None:
+        return submit_job(run_batch, items, source_name=f"batch of {len(items)} sources", workspace=workspace,
+                          regenerate=regenerate, tier=tier)
+    if is_truthy(request.args.get('stream', data.get('stream'))):
+        return stream_pipeline(run_batch, items, on_finish=remove_spooled, trace=wants_trace(data), as_list=False,
+                               regenerate=regenerate, tier=tier)
+    try:
+        return jsonify(run_pipeline(run_batch, items, trace=wants_trace(data), regenerate=regenerate,
+                                    tier=tier))
+    except Exception as e:
+        app.logger.error(f"An unhandled error occurred: {e}", exc_info=True)
+        return jsonify({"error": "An internal server error occurred."}), 500
+    finally:
+        remove_spooled()
+
+@app.route('/metrics', methods=['GET'])
+def handle_metrics():
+    body = render_prometheus(cache_stats=get_cache().stats(), job_stats=get_job_manager().stats())
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache', methods=['GET'])
+def handle_cache_stats():
+    return jsonify(get_cache().stats())
+
+@app.route('/api/jobs', methods=['GET'])
+def handle_job_stats():
+    return jsonify(get_job_manager().stats())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def handle_job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    job.pop('result', None)
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def handle_job_result(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    if job['status'] == 'completed':
+        result = dict(job['result'], trace=job['trace']) if wants_trace() else job['result']
+        # a batch answers {"results": [...]} like the synchronous batch route, single sources keep the list shape
+        return jsonify(result if 'results' in result else [result])
+    if job['status'] == 'failed':
+        return jsonify({"error": job['error'], "retry_url": f"/api/jobs/{job_id}/retry"}), 400
+    return jsonify({"job_id": job_id, "status": job['status']}), 202
+
+@app.route('/api/jobs/<job_id>/retry', methods=['POST'])
+def handle_job_retry(job_id):
+    # resumes a failed job from its last checkpointed stage
+    try:
+        if get_job_manager().retry(job_id) is None:
+            return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    except JobNotRetryable as e:
+        return jsonify({"error": str(e)}), 409
+    except JobQueueFull as e:
+        return queue_full(e)
+    return job_links(job_id)
  
 if __name__ == '__main__':
-    if not whisper_model:
-        logging.error("Application cannot start because the Whisper model failed to load.")
-    else:
-        app.run(debug=True, port=5000)
\ No newline at end of file
+    app.run(debug=True, port=5000)
\ No newline at end of file
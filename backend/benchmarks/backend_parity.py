@@ -0,0 +1,175 @@
+"""Accuracy parity and speed of an inference backend against the fp32 torch models.
+
+Run from the backend directory (needs the real models and, for onnx, optimum[onnxruntime]):
+
+    python -m benchmarks.backend_parity int8
+    python -m benchmarks.backend_parity onnx --sentences 24 --output parity.json
+
+Each key-point transformer is loaded once per backend and fed the same fixture inputs; the outputs are
+compared pairwise, and the run fails (exit code 1) when a score falls below its threshold.
+"""
+import argparse
+import gc
+import json
+import re
+import sys
+import time
+from collections import Counter
+import numpy as np
+from benchmarks.harness import configure_environment
+from benchmarks.fixtures import build_transcript
+
+# generation is greedy-ish beam search, so small numeric drift can change a word here and there
+THRESHOLDS = {
+    "question_generator": {"token_f1": 0.80},
+    "answer_extractor": {"token_f1": 0.90},
+    "fact_synthesizer": {"token_f1": 0.80},
+    "similarity": {"min_cosine": 0.97},
+    "keypoints": {"agreement": 0.85},
+}
+
+
+def token_f1(a, b):
+    a_tokens, b_tokens = a.lower().split(), b.lower().split()
+    if not a_tokens or not b_tokens:
+        return float(a_tokens == b_tokens)
+    common = sum((Counter(a_tokens) & Counter(b_tokens)).values())
+    if not common:
+        return 0.0
+    precision, recall = common / len(b_tokens), common / len(a_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+def _texts(results):
+    texts = []
+    for result in results:
+        result = result[0] if isinstance(result, list) else result
+        texts.append("" if result is None else result.get("generated_text", result.get("answer", "")).strip())
+    return texts
+
+
+def build_inputs(count):
+    sentences = [s for s in re.split(r'(?<=[.!?])\s+', build_transcript(count * 40)) if len(s.split()) > 10]
+    sentences = list(dict.fromkeys(sentences))[:count]
+    context = " ".join(sentences)
+    questions = [f"What does the text say about {' '.join(sentence.split()[1:4])}?" for sentence in sentences]
+    return {
+        "question_generator": [f"generate question: {sentence}" for sentence in sentences],
+        "answer_extractor": [{"question": question, "context": context} for question in questions],
+        "fact_synthesizer": [f"Create a clear, factual statement based on this information:\n"
+                             f"Question: {question}\nAnswer: {sentence}\n\nFactual statement:"
+                             for question, sentence in zip(questions, sentences)],
+        "similarity": sentences,
+        "text": build_transcript(1500),
+    }
+
+
+def run_backend(backend, inputs, batch_size):
+    # loads one model at a time so only a single copy is ever held in memory
+    from quiz_pipeline.keypoint_extraction import (load_model, run_batched, extract_keypoints_improved, MODEL_TASKS,
+                                                   SIMILARITY_MODEL, KEYWORD_MODEL, KEYPOINT_MODELS)
+    from quiz_pipeline.model_registry import registry
+    from quiz_pipeline.metrics import rss_bytes
+    outputs, seconds, memory = {}, {}, {}
+    for name in list(MODEL_TASKS) + [SIMILARITY_MODEL]:
+        before = rss_bytes()
+        model = load_model(name, backend)
+        memory[name] = rss_bytes() - before
+        started = time.perf_counter()
+        if name == SIMILARITY_MODEL:
+            outputs[name] = model.encode(inputs[name], convert_to_numpy=True)
+        else:
+            kwargs = {"max_length": 64, "num_beams": 3} if MODEL_TASKS[name] == "text2text-generation" else {}
+            outputs[name] = _texts(run_batched(model, inputs[name], batch_size, **kwargs))
+        seconds[name] = round(time.perf_counter() - started, 3)
+        del model
+        gc.collect()
+
+    # end to end: the registry serves this backend's models to the real extractor
+    for name in KEYPOINT_MODELS:
+        registry.unload(name)
+    for name in list(MODEL_TASKS) + [SIMILARITY_MODEL]:
+        registry.register(name, lambda name=name: load_model(name, backend))
+    registry.get(KEYWORD_MODEL)
+    started = time.perf_counter()
+    outputs["keypoints"] = extract_keypoints_improved(inputs["text"])
+    seconds["keypoints"] = round(time.perf_counter() - started, 3)
+    for name in KEYPOINT_MODELS:
+        registry.unload(name)
+    gc.collect()
+    return outputs, seconds, memory
+
+
+def compare(reference, candidate, encoder):
+    scores = {}
+    for name in ("question_generator", "answer_extractor", "fact_synthesizer"):
+        f1 = [token_f1(a, b) for a, b in zip(reference[name], candidate[name])]
+        exact = [a == b for a, b in zip(reference[name], candidate[name])]
+        scores[name] = {"token_f1": round(float(np.mean(f1)), 4), "exact_match": round(float(np.mean(exact)), 4)}
+
+    a, b = reference["similarity"], candidate["similarity"]
+    cosine = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+    scores["similarity"] = {"min_cosine": round(float(cosine.min()), 4), "mean_cosine": round(float(cosine.mean()), 4)}
+
+    # share of the reference key points that have a close counterpart in the candidate's list
+    agreement = 0.0
+    if reference["keypoints"] and candidate["keypoints"]:
+        ref = encoder.encode(reference["keypoints"], convert_to_numpy=True)
+        cand = encoder.encode(candidate["keypoints"], convert_to_numpy=True)
+        ref = ref / np.linalg.norm(ref, axis=1, keepdims=True)
+        cand = cand / np.linalg.norm(cand, axis=1, keepdims=True)
+        agreement = float(np.mean((ref @ cand.T).max(axis=1) > 0.8))
+    scores["keypoints"] = {"agreement": round(agreement, 4), "reference_count": len(reference["keypoints"]),
+                           "candidate_count": len(candidate["keypoints"])}
+    return scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check an inference backend against the fp32 torch models.")
+    parser.add_argument("backend", choices=["int8", "onnx"])
+    parser.add_argument("--sentences", type=int, default=16, help="inputs per model")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    configure_environment()
+    from quiz_pipeline.keypoint_extraction import load_model, SIMILARITY_MODEL
+    inputs = build_inputs(args.sentences)
+
+    print("-> torch (reference)", file=sys.stderr)
+    reference, reference_seconds, reference_memory = run_backend("torch", inputs, args.batch_size)
+    print(f"-> {args.backend}", file=sys.stderr)
+    candidate, candidate_seconds, candidate_memory = run_backend(args.backend, inputs, args.batch_size)
+    scores = compare(reference, candidate, load_model(SIMILARITY_MODEL, "torch"))
+
+    failures = [f"{name}.{metric} = {scores[name][metric]} < {minimum}"
+                for name, limits in THRESHOLDS.items() for metric, minimum in limits.items()
+                if scores[name][metric] < minimum]
+    for name in THRESHOLDS:
+        speedup = reference_seconds[name] / candidate_seconds[name] if candidate_seconds[name] else None
+        print(f"{name:<20} {json.dumps(scores[name])}  torch {reference_seconds[name]}s, "
+              f"{args.backend} {candidate_seconds[name]}s" + (f" ({speedup:.2f}x)" if speedup else ""),
+              file=sys.stderr)
+    for failure in failures:
+        print(f"x {failure}", file=sys.stderr)
+
+    report = {
+        "backend": args.backend,
+        "passed": not failures,
+        "failures": failures,
+        "scores": scores,
+        "seconds": {"torch": reference_seconds, args.backend: candidate_seconds},
+        # resident memory added by loading each model, a rough but comparable footprint
+        "load_rss_bytes": {"torch": reference_memory, args.backend: candidate_memory},
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare(old, new, metric="p50_ms", threshold=0.10):
+    # returns (rows, regressions); a regression is a case that got slower by more than threshold
+    rows, regressions = [], []
+    for name in sorted(set(old) | set(new)):
+        before = old.get(name, {}).get(metric)
+        after = new.get(name, {}).get(metric)
+        if before is None or after is None:
+            rows.append((name, before, after, None))
+            continue
+        change = (after - before) / before if before else 0.0
+        rows.append((name, before, after, change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p95_ms", "mean_ms", "min_ms"])
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    rows, regressions = compare(load(args.old), load(args.new), args.metric, args.threshold)
+    width = max([len(row[0]) for row in rows] + [4])
+    print(f"{'case':<{width}}  {'old':>12}  {'new':>12}  {'change':>8}")
+    for name, before, after, change in rows:
+        shown = "n/a" if change is None else f"{change:+.1%}"
+        flag = "  <-- slower" if name in regressions else ""
+        print(f"{name:<{width}}  {before if before is not None else '-':>12}  "
+              f"{after if after is not None else '-':>12}  {shown:>8}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%} ({args.metric}).")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
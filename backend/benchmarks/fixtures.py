@@ -0,0 +1,59 @@
+import os
+import random
+import re
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# word counts chosen so that "large" crosses KEYPOINT_CHUNK_THRESHOLD_WORDS and takes the chunked path
+TRANSCRIPT_SIZES = {"small": 600, "medium": 2500, "large": 12000}
+# "large" is above PDF_PARALLEL_MIN_PAGES so page extraction fans out to worker processes
+PDF_SIZES = {"small": 5, "medium": 40, "large": 240}
+QUIZ_TEXT_REPEATS = {"small": 1, "large": 50}
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _sentences():
+    corpus = read_fixture("corpus.txt")
+    return [s.strip() for s in re.split(r'(?<=[.!?])\s+', corpus) if s.strip()]
+
+
+def build_transcript(words, seed=0):
+    # deterministic: the same size and seed always produce the same text
+    sentences = _sentences()
+    rng = random.Random(seed)
+    parts, count = [], 0
+    while count < words:
+        batch = sentences[:]
+        rng.shuffle(batch)
+        for sentence in batch:
+            parts.append(sentence)
+            count += len(sentence.split())
+            if count >= words:
+                break
+    return " ".join(parts)
+
+
+def build_quiz_text(repeats):
+    block = read_fixture("quiz_response.txt").strip()
+    return "\n\n".join(block for _ in range(repeats))
+
+
+def build_pdf(path, pages, seed=0):
+    import fitz
+    if os.path.exists(path):
+        return path
+    text = build_transcript(pages * 350, seed)
+    words = text.split()
+    per_page = max(1, len(words) // pages)
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        chunk = " ".join(words[page_number * per_page:(page_number + 1) * per_page])
+        page.insert_textbox(fitz.Rect(50, 50, 545, 792), chunk, fontsize=9)
+    doc.save(path)
+    doc.close()
+    return path
@@ -0,0 +1,75 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.fixtures import read_fixture
+
+
+class GeminiStub:
+    # local stand-in for the generateContent / streamGenerateContent REST endpoints, answering with fixtures
+
+    def __init__(self, latency=0.0, chunk_chars=80):
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.text_response = read_fixture("quiz_response.txt")
+        self.json_response = read_fixture("quiz_response.json")
+        self.requests = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def _response_text(self, payload):
+        config = payload.get("generationConfig") or {}
+        return self.json_response if config.get("responseMimeType") == "application/json" else self.text_response
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                text = stub._response_text(payload)
+                if ":streamGenerateContent" in self.path:
+                    self._stream(text)
+                else:
+                    body = json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]}).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def _stream(self, text):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for start in range(0, len(text), stub.chunk_chars):
+                    chunk = {"candidates": [{"content": {"parts": [{"text": text[start:start + stub.chunk_chars]}]}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8"))
+                self.wfile.flush()
+                self.close_connection = True
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="gemini-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,81 @@
+import contextlib
+import gc
+import io
+import logging
+import os
+import time
+import tracemalloc
+from quiz_pipeline.metrics import collect_trace, peak_rss_bytes
+
+
+def configure_environment(**overrides):
+    # config.py reads the environment at import time, so this has to happen before quiz_pipeline is loaded
+    # (this module only imports quiz_pipeline.metrics, which does not read it)
+    os.environ.update({"CACHE_ENABLED": "false", "PRELOAD_MODELS": "", **overrides})
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(seconds):
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 3),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 3),
+        "min_ms": round(min(seconds) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3),
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    # the pipeline prints and logs progress lines; keep them out of the timings and the report
+    logging.disable(logging.INFO)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def measure(fn, iterations=5, warmup=1, units=None, unit=None):
+    # warm-up runs first, then one untimed pass under tracemalloc for peak memory, then the timed runs
+    with quiet():
+        for _ in range(warmup):
+            fn()
+
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        _, peak_allocated = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        samples = []
+        stage_samples = {}
+        for _ in range(iterations):
+            gc.collect()
+            with collect_trace() as trace:
+                started = time.perf_counter()
+                fn()
+                samples.append(time.perf_counter() - started)
+            per_stage = {}
+            for span in trace.spans:
+                per_stage[span["stage"]] = per_stage.get(span["stage"], 0.0) + span["wall_seconds"]
+            for stage, seconds in per_stage.items():
+                stage_samples.setdefault(stage, []).append(seconds)
+
+    result = {"iterations": iterations}
+    result.update(summarize(samples))
+    if units:
+        result["throughput"] = {"unit": f"{unit}/s", "value": round(units / percentile(samples, 50), 3)}
+    result["peak_allocated_bytes"] = peak_allocated
+    result["peak_rss_bytes"] = peak_rss_bytes()
+    result["stages"] = {stage: summarize(values) for stage, values in sorted(stage_samples.items())}
+    return result
@@ -0,0 +1,118 @@
+"""Latency and quality of the key-point tiers, side by side.
+
+Run from the backend directory:
+
+    python -m benchmarks.keypoint_tiers --output tiers.json
+    python -m benchmarks.keypoint_tiers --models real --sizes small medium
+
+With the default stand-in models the numbers only describe the pipeline code around the models; use
+--models real (weights must be downloaded, see quiz_pipeline.warmup) before choosing a tier for an SLA.
+
+Quality is measured without reference answers:
+  key_phrase_coverage  share of the document's top key phrases that appear in at least one key point
+  redundancy           mean similarity of every key point to its closest neighbour in the same list (lower is better)
+  agreement_with_full  mean similarity of every "full" key point to its closest key point from this tier
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+from benchmarks.harness import configure_environment
+from benchmarks.fixtures import TRANSCRIPT_SIZES, build_transcript
+
+
+def quality(key_points, reference, text):
+    from quiz_pipeline.model_registry import get_model
+    from quiz_pipeline.embedding_index import normalize_rows
+    from quiz_pipeline.keypoint_extraction import KEYWORD_MODEL, SIMILARITY_MODEL
+    if not key_points:
+        return {"count": 0, "key_phrase_coverage": 0.0, "redundancy": None, "agreement_with_full": 0.0}
+
+    phrases = [phrase for phrase, _ in get_model(KEYWORD_MODEL).extract_keywords(
+        text, keyphrase_ngram_range=(1, 3), stop_words='english', top_n=30)]
+    joined = " ".join(key_points).lower()
+    coverage = sum(1 for phrase in phrases if phrase.lower() in joined) / len(phrases) if phrases else 0.0
+
+    encoder = get_model(SIMILARITY_MODEL)
+    embeddings = normalize_rows(encoder.encode(key_points, convert_to_numpy=True))
+    redundancy = None
+    if len(key_points) > 1:
+        similarities = embeddings @ embeddings.T
+        np.fill_diagonal(similarities, -1.0)
+        redundancy = float(similarities.max(axis=1).mean())
+
+    agreement = 0.0
+    if reference:
+        reference_embeddings = normalize_rows(encoder.encode(reference, convert_to_numpy=True))
+        agreement = float((reference_embeddings @ embeddings.T).max(axis=1).mean())
+
+    return {"count": len(key_points), "key_phrase_coverage": round(coverage, 4),
+            "redundancy": None if redundancy is None else round(redundancy, 4),
+            "agreement_with_full": round(agreement, 4)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the key-point tiers on latency and quality.")
+    parser.add_argument("--models", choices=["stand-in", "real"], default="stand-in")
+    parser.add_argument("--sizes", nargs="*", default=list(TRANSCRIPT_SIZES), choices=list(TRANSCRIPT_SIZES))
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    configure_environment()
+    from benchmarks.harness import measure, quiet
+    from quiz_pipeline.keypoint_extraction import KEYPOINT_TIERS, extract_keypoints
+    if args.models == "stand-in":
+        from benchmarks import stand_ins
+        stand_ins.install()
+
+    results = {}
+    for size in args.sizes:
+        text = build_transcript(TRANSCRIPT_SIZES[size])
+        outputs = {}
+        with quiet():
+            for tier in KEYPOINT_TIERS:
+                outputs[tier] = extract_keypoints(text, tier=tier)
+        for tier in KEYPOINT_TIERS:
+            name = f"{tier}/{size}"
+            print(f"-> {name}", file=sys.stderr)
+            result = measure(lambda tier=tier: extract_keypoints(text, tier=tier), args.iterations, args.warmup,
+                             TRANSCRIPT_SIZES[size], "words")
+            result["quality"] = quality(outputs[tier], outputs.get("full"), text)
+            results[name] = result
+
+    print(f"\n{'case':<14}  {'p50 ms':>10}  {'p95 ms':>10}  {'count':>5}  {'coverage':>8}  {'redundancy':>10}  "
+          f"{'agreement':>9}", file=sys.stderr)
+    for name, result in results.items():
+        scores = result["quality"]
+        redundancy = "-" if scores["redundancy"] is None else f"{scores['redundancy']:.3f}"
+        print(f"{name:<14}  {result['p50_ms']:>10.1f}  {result['p95_ms']:>10.1f}  {scores['count']:>5}  "
+              f"{scores['key_phrase_coverage']:>8.3f}  {redundancy:>10}  {scores['agreement_with_full']:>9.3f}",
+              file=sys.stderr)
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "models": args.models,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Offline benchmarks for the quiz pipeline.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.compare old.json bench.json
+    python -m benchmarks.keypoint_tiers --output tiers.json
+
+Models are replaced by the stand-ins in benchmarks/stand_ins.py and Gemini by a local stub server, so
+no network access or model downloads are needed. Audio stages (yt-dlp, ffmpeg, Whisper) are not covered.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.fixtures import (TRANSCRIPT_SIZES, PDF_SIZES, QUIZ_TEXT_REPEATS, build_transcript, build_quiz_text,
+                                 build_pdf, read_fixture)
+from benchmarks.gemini_stub import GeminiStub
+from benchmarks.harness import configure_environment
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def build_cases(workdir):
+    # (name, callable, units per call, unit); imports are deferred until the environment is configured
+    from quiz_pipeline.quiz_generation import parse_quiz_text, validate_quiz_json, generate_quiz
+    from quiz_pipeline.pdf_processing import extract_text_from_pdf_path
+    from quiz_pipeline.keypoint_extraction import extract_keypoints_improved, extract_keypoints_fast
+    from quiz_pipeline.pipeline import quiz_from_text
+    from benchmarks import stand_ins
+    stand_ins.install()
+
+    cases = []
+    for size, repeats in QUIZ_TEXT_REPEATS.items():
+        quiz_text = build_quiz_text(repeats)
+        cases.append((f"parse_quiz_text/{size}", lambda quiz_text=quiz_text: parse_quiz_text(quiz_text),
+                      8 * repeats, "questions"))
+    quiz_json = json.loads(read_fixture("quiz_response.json"))
+    cases.append(("validate_quiz_json", lambda: validate_quiz_json(quiz_json), 8, "questions"))
+
+    pdf_paths = {}
+    for size, pages in PDF_SIZES.items():
+        pdf_paths[size] = build_pdf(os.path.join(workdir, f"{size}.pdf"), pages)
+        cases.append((f"extract_text_from_pdf/{size}",
+                      lambda path=pdf_paths[size]: extract_text_from_pdf_path(path), pages, "pages"))
+
+    for size, words in TRANSCRIPT_SIZES.items():
+        transcript = build_transcript(words)
+        cases.append((f"extract_keypoints/{size}", lambda text=transcript: extract_keypoints_improved(text),
+                      words, "words"))
+        cases.append((f"extract_keypoints/fast/{size}", lambda text=transcript: extract_keypoints_fast(text),
+                      words, "words"))
+
+    key_points = "\n- ".join(build_transcript(400).split(". ")[:20])
+    cases.append(("generate_quiz/structured", lambda: generate_quiz(key_points, structured=True), 8, "questions"))
+    cases.append(("generate_quiz/text", lambda: generate_quiz(key_points, structured=False), 8, "questions"))
+    cases.append(("generate_quiz/stream", lambda: generate_quiz(key_points, on_question=lambda item: None),
+                  8, "questions"))
+
+    for size in ("small", "medium"):
+        transcript = build_transcript(TRANSCRIPT_SIZES[size])
+        cases.append((f"quiz_from_text/{size}", lambda text=transcript: quiz_from_text(text, "benchmark"),
+                      TRANSCRIPT_SIZES[size], "words"))
+
+    import backend_app
+    client = backend_app.app.test_client()
+
+    def post_pdf(path):
+        with open(path, "rb") as f:
+            response = client.post("/api/generate-quiz", data={"file": (f, os.path.basename(path))},
+                                   content_type="multipart/form-data")
+        if response.status_code != 200:
+            raise RuntimeError(f"route returned HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    for size in ("small", "medium"):
+        cases.append((f"route/generate-quiz/pdf/{size}", lambda path=pdf_paths[size]: post_pdf(path),
+                      PDF_SIZES[size], "pages"))
+    return cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the quiz pipeline.")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--only", action="append", default=[],
+                        help="run only cases whose name contains this text (repeatable)")
+    parser.add_argument("--gemini-latency", type=float, default=0.0,
+                        help="seconds the stub waits before answering, to model API round trips")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    stub = GeminiStub(latency=args.gemini_latency).start()
+    configure_environment(GEMINI_API_KEY="benchmark", GEMINI_API_BASE=stub.base_url, GEMINI_REQUESTS_PER_MINUTE="0",
+                          GEMINI_MAX_RETRIES="0")
+    from benchmarks.harness import measure
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="quiz_bench_") as workdir:
+        for name, fn, units, unit in build_cases(workdir):
+            if args.only and not any(text in name for text in args.only):
+                continue
+            print(f"-> {name}", file=sys.stderr)
+            try:
+                results[name] = measure(fn, args.iterations, args.warmup, units, unit)
+            except Exception as e:
+                results[name] = {"error": str(e)}
+            summary = results[name]
+            print(f"   {summary.get('p50_ms', '-')} ms p50, {summary.get('p95_ms', '-')} ms p95"
+                  + (f"  ERROR: {summary['error']}" if "error" in summary else ""), file=sys.stderr)
+    stub.stop()
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "gemini_latency": args.gemini_latency,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import hashlib
+import re
+from collections import Counter
+import numpy as np
+
+# tiny deterministic replacements for the transformer, KeyBERT, MiniLM and spaCy models, so the benchmarks
+# measure the pipeline's own code (batching, chunking, retrieval, dedup, parsing) without downloading weights
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'-]+")
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+_STOP_WORDS = {
+    "the", "and", "that", "this", "with", "from", "into", "which", "their", "they", "them", "while", "where",
+    "when", "what", "will", "would", "there", "been", "have", "has", "are", "was", "were", "for", "its", "than",
+    "then", "such", "also", "more", "most", "some", "many", "each", "other", "over", "under", "after", "before",
+    "does", "used", "using", "between", "about", "generate", "question", "answer", "information", "statement",
+}
+
+
+def _keywords(text):
+    return [w.lower() for w in _WORD_RE.findall(text) if len(w) > 3 and w.lower() not in _STOP_WORDS]
+
+
+class Span:
+    def __init__(self, text):
+        self.text = text
+
+
+class Doc:
+    def __init__(self, text):
+        self.text = text
+        self.sents = [Span(s) for s in _SENTENCE_RE.split(text) if s.strip()]
+
+    def __len__(self):
+        return len(self.text.split())
+
+
+class StandInNlp:
+    def __call__(self, text):
+        return Doc(text)
+
+
+class StandInEncoder:
+    # hashed bag of words, normalised downstream like the real sentence embeddings
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+
+    def _bucket(self, word):
+        return int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little") % self.dimensions
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in _keywords(text) or ["empty"]:
+                vectors[row, self._bucket(word)] += 1.0
+        return vectors[0] if single else vectors
+
+
+class StandInKeyBERT:
+    def extract_keywords(self, text, keyphrase_ngram_range=(1, 1), stop_words=None, top_n=5, **kwargs):
+        counts = Counter(_keywords(text))
+        if not counts:
+            return []
+        top = counts.most_common(top_n)
+        highest = top[0][1]
+        return [(word, round(0.3 + 0.6 * count / highest, 4)) for word, count in top]
+
+
+def _batched(fn):
+    # mimics the transformers pipeline calling convention: a single input or a list of inputs
+    def call(self, inputs, **kwargs):
+        if isinstance(inputs, list):
+            return [fn(self, item, **kwargs) for item in inputs]
+        return fn(self, inputs, **kwargs)
+    return call
+
+
+class StandInQuestionGenerator:
+    @_batched
+    def __call__(self, prompt, num_return_sequences=1, **kwargs):
+        words = _keywords(prompt)[:6] or ["topic"]
+        return [{"generated_text": f"What is the role of {' '.join(words[i:] + words[:i])}?"}
+                for i in range(num_return_sequences)]
+
+
+class StandInAnswerExtractor:
+    @_batched
+    def __call__(self, item, **kwargs):
+        question_words = set(_keywords(item["question"]))
+        best, best_overlap = "", 0
+        for sentence in _SENTENCE_RE.split(item["context"]):
+            overlap = len(question_words & set(_keywords(sentence)))
+            if overlap > best_overlap:
+                best, best_overlap = sentence, overlap
+        score = min(0.99, 0.4 + 0.1 * best_overlap)
+        return {"answer": " ".join(best.split()[:20]), "score": score, "start": 0, "end": len(best)}
+
+
+class StandInFactSynthesizer:
+    _ANSWER_RE = re.compile(r'Answer:\s*(.*?)\s*Factual statement:', re.S)
+
+    @_batched
+    def __call__(self, prompt, **kwargs):
+        match = self._ANSWER_RE.search(prompt)
+        return [{"generated_text": (match.group(1) if match else prompt).strip().rstrip('.') + "."}]
+
+
+def install():
+    # overrides the registered loaders; must run before anything asks the registry for these models
+    from quiz_pipeline.model_registry import registry
+    from quiz_pipeline.keypoint_extraction import (QUESTION_GENERATOR, ANSWER_EXTRACTOR, FACT_SYNTHESIZER,
+                                                   KEYWORD_MODEL, SIMILARITY_MODEL, SPACY_MODEL)
+    stand_ins = {
+        QUESTION_GENERATOR: StandInQuestionGenerator,
+        ANSWER_EXTRACTOR: StandInAnswerExtractor,
+        FACT_SYNTHESIZER: StandInFactSynthesizer,
+        KEYWORD_MODEL: StandInKeyBERT,
+        SIMILARITY_MODEL: StandInEncoder,
+        SPACY_MODEL: StandInNlp,
+    }
+    for name, loader in stand_ins.items():
+        registry.unload(name)
+        registry.register(name, loader)
+    return list(stand_ins)
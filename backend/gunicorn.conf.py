@@ -0,0 +1,68 @@
+# production entry point, run from the backend directory:
+#
+#   gunicorn -c gunicorn.conf.py backend_app:app
+#   SERVER_ROLE=cpu gunicorn -c gunicorn.conf.py backend_app:app
+#
+# roles size one deployment for one kind of traffic; run one instance per role behind a proxy:
+#   cpu  few processes, few threads, every model preloaded - /api/generate-quiz, /api/generate-quiz-batch and
+#        /api/jobs/<id>/retry (Whisper, transformers)
+#   io   no models, many threads - job status/results, /api/health, /api/ready, /metrics, cache stats
+#   all  a single deployment serving everything (default)
+#
+# models are loaded in the master before forking, so workers share the read-only weights copy-on-write.
+# a job runs in the worker that accepted it and writes its record to WORKSPACE_DIR, so status and result polls
+# can reach any worker of any role as long as they all share that directory. every worker sweeps it for stale
+# runs.
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from quiz_pipeline.serving import threads_per_worker, limit_threads
+
+ROLES = {
+    "cpu": {"workers": max(1, (os.cpu_count() or 1) // 4), "threads": 2, "preload": "all", "timeout": 900,
+            "max_requests": 0},
+    "io": {"workers": 2, "threads": 32, "preload": "", "timeout": 120, "max_requests": 500},
+    "all": {"workers": 2, "threads": 8, "preload": "all", "timeout": 900, "max_requests": 0},
+}
+
+role = os.getenv("SERVER_ROLE", "all")
+if role not in ROLES:
+    raise ValueError(f"SERVER_ROLE must be one of {', '.join(ROLES)}, got '{role}'")
+defaults = ROLES[role]
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", defaults["workers"]))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", defaults["threads"]))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", defaults["timeout"]))
+graceful_timeout = 60
+keepalive = 5
+preload_app = True
+# only workers that run no jobs are recycled: a recycled worker gets graceful_timeout to exit, which would cut
+# off the jobs it is still running
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", defaults["max_requests"]))
+max_requests_jitter = 50 if max_requests else 0
+
+torch_threads = threads_per_worker(workers, int(os.getenv("WORKER_TORCH_THREADS", 0)))
+
+# read by quiz_pipeline.config when the app is preloaded, which happens after this file runs
+os.environ.setdefault("PRELOAD_MODELS", defaults["preload"])
+# the warm-up must finish in the master before the fork, not on a thread the workers would not inherit
+os.environ["PRELOAD_IN_BACKGROUND"] = "false"
+# model stages run inside the gunicorn worker so they use the shared weights instead of a spawned copy
+os.environ.setdefault("JOB_CPU_WORKERS", "0")
+limit_threads(torch_threads)
+
+
+def when_ready(server):
+    # move everything loaded so far out of the collector's reach, so gc passes in the workers do not
+    # touch (and un-share) the pages holding the preloaded models
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Role '{role}': {workers} workers x {threads} threads, {torch_threads} torch threads each.")
+
+
+def post_fork(server, worker):
+    limit_threads(torch_threads)
@@ -0,0 +1,143 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from quiz_pipeline.pipeline import (report, is_live, keypoints_from_text, quiz_from_keypoints, local_transcript,
+                                    cached_url_transcript, download_url_audio, transcribe_url_audio, pdf_file_text)
+from quiz_pipeline.cache import normalize_url, hash_file
+from quiz_pipeline.metrics import bind
+from quiz_pipeline.workspace import child_workspace, scratch_dir, discard_scratch_dir
+from quiz_pipeline.config import BATCH_IO_WORKERS, BATCH_MODEL_WORKERS, BATCH_PREFETCH
+
+logger = logging.getLogger(__name__)
+
+# a batch item is {"kind": "url" | "path" | "pdf", "source": <url, path or upload filename>}, pdf items also
+# carry "path", the spooled copy of the upload. every item goes through three stages:
+#   prepare  (io threads)  download audio, look up cached transcripts, read pdf text
+#   models   (model lane)  transcription and key points, with the models loaded once in this process
+#   quiz     (io threads)  the gemini request
+# so the next item downloads while the current one is transcribed, and finished key points wait on gemini
+# without holding up the models. in a job workspace each item checkpoints into its own sub-workspace, so a
+# retried batch only redoes the items (and stages) that did not finish.
+
+
+def source_key(item):
+    if item["kind"] == "url":
+        return "url:" + normalize_url(item["source"])
+    if item["kind"] == "path":
+        return "path:" + os.path.realpath(item["source"])
+    return "pdf:" + hash_file(item["path"])
+
+
+def plan_batch(items):
+    # returns (unique items, index into the unique items for every input), identical sources run once
+    unique, positions, order = [], {}, []
+    for item in items:
+        key = source_key(item)
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append(item)
+        order.append(positions[key])
+    return unique, order
+
+
+def _prepare(item, progress):
+    if item["kind"] == "url":
+        url_key, item["transcript_key"], item["text"] = cached_url_transcript(item["source"])
+        if item["text"] is not None:
+            report(progress, "transcription", "done", characters=len(item["text"]), cached=True)
+            return None
+        item["audio_file"] = download_url_audio(item["source"], url_key, item["download_dir"], progress)
+        if not item["audio_file"]:
+            return "Failed to download or extract audio from URL."
+    elif item["kind"] == "pdf":
+        item["text"], error = pdf_file_text(item["path"], progress)
+        item["source_name"] = item["source"]
+        return error
+    return None
+
+
+def _transcribe(item, progress, cpu):
+    if item["kind"] == "url":
+        item["source_name"] = item["source"]
+        if item["text"] is None:
+            item["text"] = transcribe_url_audio(item["audio_file"], item["transcript_key"], progress, cpu)
+            if not item["text"]:
+                return "Transcription failed for the URL."
+            discard_scratch_dir(item["download_dir"])
+    elif item["kind"] == "path":
+        transcript = local_transcript(item["source"], progress, cpu)
+        if "failures" in transcript:
+            item["failures"] = transcript["failures"]
+        if 'error' in transcript:
+            return transcript["error"]
+        item["text"], item["source_name"] = transcript["text"], transcript["source_name"]
+    return None
+
+
+def _models(item, progress, cpu, tier):
+    error = _transcribe(item, progress, cpu)
+    if error:
+        return error
+    item["key_points"] = keypoints_from_text(item["text"], progress=progress, cpu=cpu, tier=tier)
+    if not item["key_points"]:
+        return "Key point extraction failed."
+    return None
+
+
+def _finish(item, result):
+    if "failures" in item:
+        result = dict(result, failures=item["failures"])
+    return result
+
+
+def run_batch(items, progress=None, cpu=None, regenerate=False, tier=None, io_workers=BATCH_IO_WORKERS,
+              model_workers=BATCH_MODEL_WORKERS, prefetch=BATCH_PREFETCH):
+    unique, order = plan_batch(items)
+    duplicates = len(items) - len(unique)
+    if duplicates:
+        logger.info(f"-> Batch of {len(items)} sources has {duplicates} duplicate(s), processing {len(unique)}.")
+    report(progress, "batch", "running", sources=len(items), unique=len(unique))
+
+    results = [None] * len(unique)
+    # bounds the items that are prepared (audio on disk, text in memory) but not yet through the models
+    slots = threading.BoundedSemaphore(max(1, model_workers) + max(0, prefetch))
+    live = is_live(progress, cpu)
+
+    def item_progress(position):
+        indices = [index for index, unique_index in enumerate(order) if unique_index == position]
+        return lambda stage, status, **data: report(progress, stage, status, sources=indices, **data)
+
+    with ThreadPoolExecutor(max_workers=max(1, model_workers), thread_name_prefix="quiz-batch-model") as models:
+
+        def run_item(position):
+            item = dict(unique[position])
+            item_report = item_progress(position) if progress is not None else None
+            try:
+                with child_workspace(f"source-{position}"), scratch_dir("download") as item["download_dir"]:
+                    with slots:
+                        error = _prepare(item, item_report)
+                        if not error:
+                            error = models.submit(bind(_models), item, item_report, cpu, tier).result()
+                    if error:
+                        result = {"error": error}
+                    else:
+                        result = quiz_from_keypoints(item["key_points"], item["source_name"], progress=item_report,
+                                                     regenerate=regenerate, live=live)
+            except Exception as e:
+                logger.error(f"Batch item {item['source']} failed: {e}", exc_info=True)
+                result = {"error": "An internal server error occurred."}
+            results[position] = _finish(item, result)
+            for index, unique_index in enumerate(order):
+                if unique_index == position:
+                    report(progress, "batch", "item", index=index,
+                           result=dict(results[position], source=items[index]["source"]))
+
+        with ThreadPoolExecutor(max_workers=max(1, io_workers), thread_name_prefix="quiz-batch-io") as io:
+            for future in [io.submit(bind(run_item), position) for position in range(len(unique))]:
+                future.result()
+
+    failed = sum(1 for result in results if 'error' in result)
+    report(progress, "batch", "done", completed=len(unique) - failed, failed=failed)
+    # duplicates share a result but keep the source they were submitted as
+    return {"results": [dict(results[unique_index], source=item["source"]) for item, unique_index in zip(items, order)]}
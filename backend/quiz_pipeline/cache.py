@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from urllib.parse import urlparse, parse_qsl, urlencode
+from quiz_pipeline.config import CACHE_ENABLED, CACHE_DIR, CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+_YOUTUBE_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_TRACKING_PARAMS = {'si', 'feature', 'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content'}
+
+
+def normalize_url(url):
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if host.startswith('m.'):
+        host = host[2:]
+
+    # the same YouTube video is reachable through several url shapes
+    video_id = None
+    if host == 'youtu.be':
+        video_id = parsed.path.strip('/').split('/')[0]
+    elif host.endswith('youtube.com'):
+        if parsed.path == '/watch':
+            video_id = dict(parse_qsl(parsed.query)).get('v')
+        elif parsed.path.startswith(('/shorts/', '/embed/', '/live/')):
+            video_id = parsed.path.split('/')[2]
+    if video_id and _YOUTUBE_ID.match(video_id):
+        return f"youtube:{video_id}"
+
+    query = sorted((k, v) for k, v in parse_qsl(parsed.query) if k not in _TRACKING_PARAMS)
+    path = parsed.path.rstrip('/') or '/'
+    return f"{parsed.scheme.lower()}://{host}{path}" + (f"?{urlencode(query)}" if query else "")
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_key(*parts):
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    # entries live under <root>/<stage>/<key[:2]>/<key><ext>; file mtime doubles as the LRU clock
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, enabled=CACHE_ENABLED):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._total_bytes = None
+
+    def _path(self, stage, key, ext):
+        return os.path.join(self.root, stage, key[:2], key + ext)
+
+    def _count(self, stage, outcome):
+        with self._lock:
+            counters = self._counters.setdefault(stage, {"hits": 0, "misses": 0, "writes": 0})
+            counters[outcome] += 1
+
+    def _size(self, path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _touch(self, path):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def get_json(self, stage, key):
+        if not self.enabled:
+            return None
+        path = self._path(stage, key, '.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self._count(stage, "misses")
+            return None
+        self._touch(path)
+        self._count(stage, "hits")
+        return value
+
+    def set_json(self, stage, key, value):
+        if not self.enabled:
+            return
+        path = self._path(stage, key, '.json')
+        # an overwritten entry gives its old bytes back to the running total
+        previous_size = self._size(path)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            # a value json cannot encode only skips the cache, the caller still has it
+            logger.warning(f"Could not write cache entry {stage}/{key}: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._count(stage, "writes")
+        self._added(self._size(path) - previous_size)
+
+    def get_file(self, stage, key, ext):
+        if not self.enabled:
+            return None
+        path = self._path(stage, key, ext)
+        if not os.path.exists(path):
+            self._count(stage, "misses")
+            return None
+        self._touch(path)
+        self._count(stage, "hits")
+        return path
+
+    def put_file(self, stage, key, src_path, ext, move=True):
+        # returns the cached copy, or the original path when caching is off or fails
+        if not self.enabled:
+            return src_path
+        path = self._path(stage, key, ext)
+        previous_size = self._size(path)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # a private temp name, so concurrent puts of the same key do not write into one file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            os.close(fd)
+            if move:
+                shutil.move(src_path, tmp_path)
+            else:
+                shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not store {src_path} in cache: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return src_path if os.path.exists(src_path) else None
+        self._count(stage, "writes")
+        self._added(self._size(path) - previous_size)
+        return path
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _added(self, size):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(entry[1] for entry in self._entries())
+            else:
+                self._total_bytes += size
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(entry[1] for entry in entries)
+            removed = 0
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            self._total_bytes = total
+        if removed:
+            logger.info(f"Evicted {removed} cache entries, {total} bytes remain.")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "root": self.root,
+                "max_bytes": self.max_bytes,
+                "total_bytes": self._total_bytes,
+                "stages": {stage: dict(counters) for stage, counters in self._counters.items()},
+            }
+
+
+result_cache = ResultCache()
+
+
+def get_cache():
+    return result_cache
@@ -0,0 +1,37 @@
+import numpy as np
+
+
+def split_into_windows(text, window_words=400, overlap_words=50):
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, window_words - overlap_words)
+    windows = []
+    for start in range(0, len(words), step):
+        windows.append(' '.join(words[start:start + window_words]))
+        if start + window_words >= len(words):
+            break
+    return windows
+
+
+class ChunkRetriever:
+    # tf-idf retrieval over transcript windows, so QA only sees the passages relevant to a question
+
+    def __init__(self, chunks):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        self.chunks = chunks
+        self.vectorizer = TfidfVectorizer(stop_words='english', max_features=5000, sublinear_tf=True)
+        self.matrix = self.vectorizer.fit_transform(chunks)
+
+    def top_k(self, query, k=3):
+        query_vector = self.vectorizer.transform([query])
+        scores = (self.matrix @ query_vector.T).toarray().ravel()
+        if not scores.any():
+            return [0]
+        k = min(k, len(self.chunks))
+        best = np.argpartition(-scores, k - 1)[:k]
+        # keep transcript order so the merged context still reads naturally
+        return sorted(int(i) for i in best if scores[i] > 0) or [int(np.argmax(scores))]
+
+    def context_for(self, query, k=3):
+        return ' '.join(self.chunks[i] for i in self.top_k(query, k))
@@ -0,0 +1,146 @@
+import os
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def get_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_int(name, default):
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def get_float(name, default):
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def get_list(name, default=None):
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return list(default or [])
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+# comma separated registry names to load at startup, or "all"
+PRELOAD_MODELS = get_list("PRELOAD_MODELS")
+# models that must be loaded before /api/ready reports ready, defaults to the preloaded ones
+READY_MODELS = get_list("READY_MODELS", PRELOAD_MODELS)
+# warm up on a background thread so the process serves health checks while models load
+PRELOAD_IN_BACKGROUND = get_bool("PRELOAD_IN_BACKGROUND", True)
+
+# whisper transcription engine
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "base")
+# "fp32" or "int8" (dynamic int8 quantisation of the linear layers, CPU only)
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "fp32").lower()
+# empty picks cuda when available, like whisper.load_model
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "")
+# 0 keeps torch's default thread count
+WHISPER_NUM_THREADS = get_int("WHISPER_NUM_THREADS", 0)
+# skip silence with voice activity detection and transcribe the speech in chunks
+TRANSCRIBE_VAD = get_bool("TRANSCRIBE_VAD", True)
+TRANSCRIBE_CHUNK_SECONDS = get_float("TRANSCRIBE_CHUNK_SECONDS", 60.0)
+# worker processes for the chunks, each holding its own whisper model; 0 picks half the cores
+TRANSCRIBE_WORKERS = get_int("TRANSCRIBE_WORKERS", 0)
+# shorter recordings are transcribed in-process, where the model is already loaded
+TRANSCRIBE_PARALLEL_MIN_SECONDS = get_float("TRANSCRIBE_PARALLEL_MIN_SECONDS", 600.0)
+
+# multiprocessing start method for worker pools; spawn avoids forking a process that already runs threads
+WORKER_START_METHOD = os.getenv("WORKER_START_METHOD", "spawn")
+
+# asynchronous job api
+JOB_WORKERS = get_int("JOB_WORKERS", 4)
+# processes for the model stages of jobs; 0 runs them on the job thread with the models already in memory
+JOB_CPU_WORKERS = get_int("JOB_CPU_WORKERS", 1)
+JOB_QUEUE_MAX = get_int("JOB_QUEUE_MAX", 16)
+JOB_RESULT_TTL = get_int("JOB_RESULT_TTL", 3600)
+JOB_START_METHOD = os.getenv("JOB_START_METHOD", WORKER_START_METHOD)
+
+# per-run directories for downloads, uploads, stage checkpoints and job records; every worker process of an
+# instance must see the same WORKSPACE_DIR. a failed job keeps its workspace for JOB_RESULT_TTL so it can be
+# retried, anything untouched for WORKSPACE_TTL is swept (e.g. after a crash)
+WORKSPACE_DIR = os.getenv("WORKSPACE_DIR", os.path.join(tempfile.gettempdir(), "quiz_workspaces"))
+WORKSPACE_TTL = get_int("WORKSPACE_TTL", 24 * 3600)
+
+# batch api: downloads, pdf reading and gemini calls overlap on the io threads while one model lane
+# transcribes and extracts key points, so every item shares the models loaded in this process
+BATCH_MAX_SOURCES = get_int("BATCH_MAX_SOURCES", 50)
+BATCH_IO_WORKERS = get_int("BATCH_IO_WORKERS", 4)
+BATCH_MODEL_WORKERS = get_int("BATCH_MODEL_WORKERS", 1)
+# prepared items (downloaded audio, extracted text) allowed to wait for the model lane
+BATCH_PREFETCH = get_int("BATCH_PREFETCH", 2)
+
+# content-addressed result cache
+CACHE_ENABLED = get_bool("CACHE_ENABLED", True)
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "quiz_generator"))
+CACHE_MAX_BYTES = get_int("CACHE_MAX_BYTES", 5 * 1024 ** 3)
+
+# key-point extraction
+KEYPOINT_BATCH_SIZE = get_int("KEYPOINT_BATCH_SIZE", 8)
+# inputs longer than this are split into overlapping windows and processed map-reduce style
+KEYPOINT_CHUNK_THRESHOLD_WORDS = get_int("KEYPOINT_CHUNK_THRESHOLD_WORDS", 3000)
+KEYPOINT_CHUNK_WORDS = get_int("KEYPOINT_CHUNK_WORDS", 400)
+KEYPOINT_CHUNK_OVERLAP = get_int("KEYPOINT_CHUNK_OVERLAP", 50)
+# number of retrieved windows used as QA context per question
+KEYPOINT_CHUNK_TOP_K = get_int("KEYPOINT_CHUNK_TOP_K", 3)
+KEYPOINT_CHUNK_WORKERS = get_int("KEYPOINT_CHUNK_WORKERS", min(4, os.cpu_count() or 1))
+# default tier when a request does not pick one: "full" generates and verifies facts with the t5/roberta/flan
+# models, "fast" ranks the text's own sentences with spaCy, TF-IDF, KeyBERT and MiniLM only
+KEYPOINT_TIER = os.getenv("KEYPOINT_TIER", "full")
+# weight of novelty against relevance when the fast tier picks sentences (0 = pure relevance)
+FAST_KEYPOINT_DIVERSITY = get_float("FAST_KEYPOINT_DIVERSITY", 0.3)
+# inference backend for the key-point transformers: "torch" (fp32), "int8" (dynamically quantised torch) or
+# "onnx" (onnxruntime via optimum, exported on first load); check a switch with python -m benchmarks.backend_parity
+KEYPOINT_BACKEND = os.getenv("KEYPOINT_BACKEND", "torch").strip().lower()
+ONNX_EXPORT_DIR = os.getenv("ONNX_EXPORT_DIR", os.path.join(os.path.expanduser("~"), ".cache", "quiz_generator_onnx"))
+
+# quiz generation
+QUIZ_DEDUP_THRESHOLD = get_float("QUIZ_DEDUP_THRESHOLD", 0.9)
+
+# parallel processing of local video directories, 0 sizes the pool from the cpu count
+DIRECTORY_CONCURRENCY = get_int("DIRECTORY_CONCURRENCY", 0)
+
+# pdf extraction
+PDF_MAX_BYTES = get_int("PDF_MAX_BYTES", 100 * 1024 ** 2)
+PDF_MAX_PAGES = get_int("PDF_MAX_PAGES", 1000)
+PDF_WORKERS = get_int("PDF_WORKERS", min(4, os.cpu_count() or 1))
+# documents shorter than this are read in-process, the pool start-up would cost more than it saves
+PDF_PARALLEL_MIN_PAGES = get_int("PDF_PARALLEL_MIN_PAGES", 64)
+PDF_PAGES_PER_TASK = get_int("PDF_PAGES_PER_TASK", 16)
+
+# gemini client
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_CONNECT_TIMEOUT = get_float("GEMINI_CONNECT_TIMEOUT", 5.0)
+GEMINI_READ_TIMEOUT = get_float("GEMINI_READ_TIMEOUT", 90.0)
+GEMINI_MAX_RETRIES = get_int("GEMINI_MAX_RETRIES", 4)
+GEMINI_BACKOFF_BASE = get_float("GEMINI_BACKOFF_BASE", 1.0)
+GEMINI_BACKOFF_MAX = get_float("GEMINI_BACKOFF_MAX", 30.0)
+# client-side token bucket, 0 disables it
+GEMINI_REQUESTS_PER_MINUTE = get_float("GEMINI_REQUESTS_PER_MINUTE", 30)
+GEMINI_BURST = get_int("GEMINI_BURST", 5)
+GEMINI_MAX_CONCURRENCY = get_int("GEMINI_MAX_CONCURRENCY", 8)
+# ask Gemini for schema-constrained JSON, the text format remains as fallback
+QUIZ_STRUCTURED_OUTPUT = get_bool("QUIZ_STRUCTURED_OUTPUT", True)
+# follow-up requests for questions that failed validation
+QUIZ_REPAIR_ATTEMPTS = get_int("QUIZ_REPAIR_ATTEMPTS", 2)
+
+# comment lines sent on an idle event stream so proxies keep the connection open
+SSE_KEEPALIVE_SECONDS = get_float("SSE_KEEPALIVE_SECONDS", 15.0)
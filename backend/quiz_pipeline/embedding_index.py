@@ -0,0 +1,67 @@
+import numpy as np
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class EmbeddingIndex:
+    # grows a normalised embedding matrix one accepted text at a time, so each check is a single mat-vec
+
+    def __init__(self, encoder, threshold=0.85, capacity=32):
+        self.encoder = encoder
+        self.threshold = threshold
+        self.texts = []
+        self._capacity = capacity
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def encode(self, texts):
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return normalize_rows(self.encoder.encode(list(texts), convert_to_numpy=True))
+
+    def embeddings(self):
+        if self._matrix is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._matrix[:len(self.texts)]
+
+    def max_similarity(self, embedding):
+        if not self.texts:
+            return -1.0
+        return float(np.max(self.embeddings() @ normalize_rows(embedding)[0]))
+
+    def is_duplicate(self, text, embedding=None):
+        if embedding is None:
+            embedding = self.encode([text])[0]
+        return self.max_similarity(embedding) > self.threshold
+
+    def add(self, text, embedding=None):
+        if embedding is None:
+            embedding = self.encode([text])[0]
+        embedding = normalize_rows(embedding)[0]
+        count = len(self.texts)
+        if self._matrix is None:
+            self._matrix = np.empty((self._capacity, embedding.shape[0]), dtype=np.float32)
+        elif count == self._matrix.shape[0]:
+            grown = np.empty((count * 2, self._matrix.shape[1]), dtype=np.float32)
+            grown[:count] = self._matrix
+            self._matrix = grown
+        self._matrix[count] = embedding
+        self.texts.append(text)
+
+    def add_if_novel(self, text, embedding=None):
+        if embedding is None:
+            embedding = self.encode([text])[0]
+        if self.is_duplicate(text, embedding):
+            return False
+        self.add(text, embedding)
+        return True
+
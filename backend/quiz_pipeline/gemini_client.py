@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from quiz_pipeline.config import (GEMINI_API_KEY, GEMINI_API_BASE, GEMINI_CONNECT_TIMEOUT, GEMINI_READ_TIMEOUT,
+                                  GEMINI_MAX_RETRIES, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX,
+                                  GEMINI_REQUESTS_PER_MINUTE, GEMINI_BURST, GEMINI_MAX_CONCURRENCY)
+from quiz_pipeline.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class GeminiError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class GeminiClient:
+    # long-lived REST client: pooled keep-alive connections, timeouts, backoff on 429/5xx and a rate limit
+
+    def __init__(self, api_key=GEMINI_API_KEY, base_url=GEMINI_API_BASE,
+                 timeout=(GEMINI_CONNECT_TIMEOUT, GEMINI_READ_TIMEOUT), max_retries=GEMINI_MAX_RETRIES,
+                 backoff_base=GEMINI_BACKOFF_BASE, backoff_max=GEMINI_BACKOFF_MAX,
+                 requests_per_minute=GEMINI_REQUESTS_PER_MINUTE, burst=GEMINI_BURST,
+                 max_concurrency=GEMINI_MAX_CONCURRENCY):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = TokenBucket(requests_per_minute / 60.0, burst)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # full jitter keeps parallel callers from retrying in lockstep
+        return random.uniform(0, delay)
+
+    def _post(self, url, payload, stream=False, params=None):
+        # returns the successful response; retries happen before any of the body is consumed
+        headers = {'x-goog-api-key': self.api_key, 'Content-Type': 'application/json'}
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                response = self.session.post(url, json=payload, headers=headers, params=params,
+                                             timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = GeminiError(f"Gemini request failed: {e}")
+            else:
+                if response.status_code == 200:
+                    return response
+                last_error = GeminiError(f"Gemini returned HTTP {response.status_code}: {response.text[:300]}",
+                                         status=response.status_code)
+                response.close()
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise last_error
+                retry_after = response.headers.get('Retry-After')
+
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, retry_after)
+                logger.warning(f"{last_error} (retrying in {delay:.1f}s, attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+        raise last_error
+
+    def _payload(self, prompt, generation_config):
+        if not self.api_key:
+            raise GeminiError("GEMINI_API_KEY is not set.")
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        return payload
+
+    @staticmethod
+    def _candidate_text(data, require=True):
+        candidates = data.get("candidates") or []
+        if not candidates:
+            if not require:
+                return ""
+            reason = (data.get("promptFeedback") or {}).get("blockReason", "no candidates returned")
+            raise GeminiError(f"Gemini returned no content: {reason}")
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+
+    def generate(self, prompt, model, generation_config=None):
+        payload = self._payload(prompt, generation_config)
+        # items counts requests like the other stages count units; the sizes go in their own fields
+        with stage_timer("gemini", items=1) as span:
+            span["prompt_chars"] = len(prompt)
+            response = self._post(f"{self.base_url}/models/{model}:generateContent", payload)
+            text = self._candidate_text(response.json())
+            span["response_chars"] = len(text)
+        return text
+
+    def stream(self, prompt, model, generation_config=None):
+        # yields text chunks from the server-sent-events variant of the endpoint as they arrive
+        payload = self._payload(prompt, generation_config)
+        # the span also covers the time the caller spends between chunks
+        with stage_timer("gemini_stream", items=1) as span:
+            span["prompt_chars"] = len(prompt)
+            yield from self._stream_chunks(
+                self._post(f"{self.base_url}/models/{model}:streamGenerateContent", payload,
+                           stream=True, params={'alt': 'sse'}), span)
+
+    def _stream_chunks(self, response, span):
+        span["response_chars"] = 0
+        with response:
+            response.encoding = response.encoding or 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = json.loads(line[len('data:'):])
+                prompt_feedback = data.get("promptFeedback") or {}
+                if prompt_feedback.get("blockReason"):
+                    raise GeminiError(f"Gemini returned no content: {prompt_feedback['blockReason']}")
+                text = self._candidate_text(data, require=False)
+                if text:
+                    span["response_chars"] += len(text)
+                    yield text
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="gemini")
+            return self._executor
+
+    def submit(self, prompt, model, generation_config=None):
+        return self._get_executor().submit(self.generate, prompt, model, generation_config)
+
+    def generate_many(self, prompts, model, generation_config=None):
+        # results come back in prompt order; a failed prompt yields its exception instead of a string
+        futures = [self.submit(prompt, model, generation_config) for prompt in prompts]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def agenerate(self, prompt, model, generation_config=None):
+        return await asyncio.wrap_future(self.submit(prompt, model, generation_config))
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _reset_client():
+    # a forked child must open its own connections
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_client)
+
+
+def get_gemini_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient()
+        return _client
@@ -0,0 +1,304 @@
+import importlib
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from quiz_pipeline.metrics import collect_trace
+from quiz_pipeline.workspace import Workspace, use_workspace, sweep_workspaces
+from quiz_pipeline.config import JOB_WORKERS, JOB_CPU_WORKERS, JOB_QUEUE_MAX, JOB_RESULT_TTL, JOB_START_METHOD
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+# expired jobs are dropped this often, also on a server that receives no new jobs
+PRUNE_INTERVAL = 60
+# stale workspaces are looked for at most this often
+SWEEP_INTERVAL = 600
+# every job writes its state here in its workspace, so any worker process can answer polls and retries for it
+JOB_RECORD = "job.json"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobNotRetryable(Exception):
+    pass
+
+
+def _call_spec(fn, args, kwargs, on_finish):
+    # how another worker process calls the job again on a retry; None when the call cannot be written down
+    if on_finish is not None:
+        return None
+    spec = {"fn": f"{fn.__module__}:{fn.__qualname__}", "args": list(args), "kwargs": kwargs}
+    try:
+        json.dumps(spec)
+    except (TypeError, ValueError):
+        return None
+    return spec
+
+
+def _resolve_call(spec):
+    module_name, _, name = spec["fn"].partition(":")
+    fn = importlib.import_module(module_name)
+    for part in name.split("."):
+        fn = getattr(fn, part)
+    return fn, tuple(spec["args"]), spec["kwargs"], None
+
+
+def _load_record(job_id):
+    # (record, workspace) of a job written by any worker process; (None, None) when there is none
+    workspace = Workspace.find(job_id)
+    if workspace is None:
+        return None, None
+    return workspace.read_file(JOB_RECORD), workspace
+
+
+class JobManager:
+    # jobs are orchestrated on threads (downloads, Gemini) and hand their model stages to a process pool.
+    # the process running a job writes its record after every change, the others read it from the workspace
+
+    def __init__(self, max_workers=JOB_WORKERS, cpu_workers=JOB_CPU_WORKERS, max_pending=JOB_QUEUE_MAX,
+                 result_ttl=JOB_RESULT_TTL, start_method=JOB_START_METHOD):
+        self.max_workers = max_workers
+        self.cpu_workers = cpu_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.start_method = start_method
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quiz-job")
+        self._cpu_pool = None
+        self._cpu_lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._stopped = threading.Event()
+        threading.Thread(target=self._janitor, name="quiz-job-janitor", daemon=True).start()
+
+    def _get_cpu_pool(self):
+        with self._cpu_lock:
+            if self._cpu_pool is None:
+                context = multiprocessing.get_context(self.start_method) if self.start_method else None
+                self._cpu_pool = ProcessPoolExecutor(max_workers=self.cpu_workers, mp_context=context)
+            return self._cpu_pool
+
+    def run_cpu(self, fn, *args, **kwargs):
+        pool = self._get_cpu_pool()
+        try:
+            return pool.submit(fn, *args, **kwargs).result()
+        except BrokenProcessPool:
+            # a worker died (usually OOM); drop the pool so the next stage gets a fresh one
+            with self._cpu_lock:
+                if self._cpu_pool is pool:
+                    self._cpu_pool = None
+            pool.shutdown(wait=False)
+            raise
+
+    def pending_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] in ACTIVE_STATUSES)
+
+    def submit(self, fn, *args, source_name=None, on_finish=None, workspace=None, **kwargs):
+        # the job keeps its workspace (uploads, downloads, stage checkpoints) until it completes or expires;
+        # callers that need to put files there first create it and pass it in
+        self._prune()
+        workspace = workspace or Workspace.create()
+        job_id = workspace.id
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job["status"] in ACTIVE_STATUSES)
+            if pending >= self.max_pending:
+                workspace.remove()
+                raise JobQueueFull(f"Job queue is full ({pending}/{self.max_pending}).")
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "source_name": source_name,
+                "status": "queued",
+                "stages": {},
+                "result": None,
+                "error": None,
+                "trace": None,
+                "attempts": 1,
+                "partial": False,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "_call": (fn, args, kwargs, on_finish),
+                "_call_spec": _call_spec(fn, args, kwargs, on_finish),
+                "_workspace": workspace,
+            }
+            self._save(self._jobs[job_id])
+        self._threads.submit(self._run, job_id, fn, args, kwargs, on_finish)
+        return job_id
+
+    def retry(self, job_id):
+        # reruns a failed job in its workspace; stages that left a checkpoint are not repeated. the job may have
+        # been accepted (or retried) by another worker process, its record then says how to call it again
+        record, workspace = _load_record(job_id)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None and record is None:
+                return None
+            # unless this process is running the job, the record is at least as new as the copy in memory
+            state = job if record is None or (job is not None and job["status"] in ACTIVE_STATUSES) else record
+            retryable = state["status"] == "failed" or (state["status"] == "completed" and state.get("partial"))
+            if not retryable or workspace is None:
+                raise JobNotRetryable(f"Only failed or partially failed jobs can be retried, this one is "
+                                      f"{state['status']}.")
+            if job is None:
+                if not record.get("call"):
+                    raise JobNotRetryable("This job can only be retried by the worker process that ran it.")
+                try:
+                    call = _resolve_call(record["call"])
+                except (ImportError, AttributeError) as e:
+                    raise JobNotRetryable(f"This job can no longer be retried: {e}")
+            pending = sum(1 for other in self._jobs.values() if other["status"] in ACTIVE_STATUSES)
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"Job queue is full ({pending}/{self.max_pending}).")
+            if job is None:
+                job = self._jobs[job_id] = {key: value for key, value in record.items() if key != "call"}
+                job.update(_call=call, _call_spec=record["call"], _workspace=workspace)
+            job.update(status="queued", error=None, result=None, partial=False, stages={}, trace=None,
+                       attempts=state["attempts"] + 1, finished_at=None)
+            self._save(job)
+            fn, args, kwargs, on_finish = job["_call"]
+        self._threads.submit(self._run, job_id, fn, args, kwargs, on_finish)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs, on_finish):
+        with self._lock:
+            workspace = self._jobs[job_id]["_workspace"]
+        with collect_trace() as trace, use_workspace(workspace):
+            # the live trace object is kept so status polls can show the stages recorded so far
+            self._update(job_id, status="running", started_at=time.time(), trace=trace)
+            # without cpu workers the model stages run on the job thread, using this process's loaded models
+            cpu = self.run_cpu if self.cpu_workers > 0 else None
+            try:
+                result = fn(*args, progress=lambda stage, status, **data: self._progress(job_id, stage, status, data),
+                            cpu=cpu, **kwargs)
+                if 'error' in result:
+                    self._update(job_id, status="failed", error=result['error'], finished_at=time.time())
+                else:
+                    # a batch completes even when some of its sources failed; those can still be retried
+                    partial = any('error' in item for item in result.get("results", []))
+                    self._update(job_id, status="completed", result=result, partial=partial, finished_at=time.time())
+                    if not partial:
+                        # the result is in the job record, nothing else in the workspace is needed any more
+                        workspace.clear(keep=(JOB_RECORD,))
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+                self._update(job_id, status="failed", error="An internal server error occurred.", finished_at=time.time())
+            finally:
+                if on_finish is not None:
+                    try:
+                        on_finish()
+                    except Exception as e:
+                        logger.warning(f"Cleanup for job {job_id} failed: {e}")
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            self._save(job)
+
+    def _save(self, job):
+        # called with the lock held, so the records of one job are written in order
+        record = {key: value for key, value in job.items() if not key.startswith("_")}
+        record["trace"] = job["trace"].as_dict() if job["trace"] is not None else None
+        record["call"] = job["_call_spec"]
+        try:
+            job["_workspace"].write_file(JOB_RECORD, record)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write the record of job {job['job_id']}: {e}")
+
+    def _progress(self, job_id, stage, status, data):
+        now = time.time()
+        with self._lock:
+            job = self._jobs[job_id]
+            entry = job["stages"].setdefault(stage, {"started_at": now})
+            if status == "item":
+                # partial outputs are only counted, the finished result carries the items themselves
+                entry["items"] = entry.get("items", 0) + 1
+                return
+            entry["status"] = status
+            if status != "running":
+                entry["finished_at"] = now
+                entry["seconds"] = round(now - entry["started_at"], 3)
+            entry.update(data)
+            self._save(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] in ACTIVE_STATUSES:
+                # running here: the live trace shows the stages recorded so far
+                return self._snapshot(job)
+        record, workspace = _load_record(job_id)
+        if record is None:
+            with self._lock:
+                job = self._jobs.get(job_id)
+                return self._snapshot(job) if job is not None else None
+        record.pop("call", None)
+        record["checkpoints"] = workspace.completed_stages()
+        return record
+
+    def _snapshot(self, job):
+        snapshot = {key: value for key, value in job.items() if not key.startswith("_")}
+        snapshot["checkpoints"] = job["_workspace"].completed_stages()
+        snapshot["stages"] = {name: dict(stage) for name, stage in job["stages"].items()}
+        snapshot["trace"] = job["trace"].as_dict() if job["trace"] is not None else None
+        return snapshot
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["status"] not in ACTIVE_STATUSES and job["finished_at"] and job["finished_at"] < cutoff]
+            expired_workspaces = [self._jobs.pop(job_id)["_workspace"] for job_id in expired]
+            known = set(self._jobs)
+            sweep = time.time() - self._last_sweep > SWEEP_INTERVAL
+            if sweep:
+                self._last_sweep = time.time()
+        # failed jobs kept their workspace for a retry until now, unless another process has retried them since
+        for workspace in expired_workspaces:
+            record = workspace.read_file(JOB_RECORD)
+            if record is None or (record["status"] not in ACTIVE_STATUSES and (record["finished_at"] or 0) < cutoff):
+                workspace.remove()
+        if sweep:
+            sweep_workspaces(keep=known)
+
+    def _janitor(self):
+        while not self._stopped.wait(PRUNE_INTERVAL):
+            try:
+                self._prune()
+            except Exception as e:
+                logger.warning(f"Pruning jobs failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"max_workers": self.max_workers, "cpu_workers": self.cpu_workers,
+                "max_pending": self.max_pending, "jobs": counts}
+
+    def shutdown(self, wait=True):
+        self._stopped.set()
+        self._threads.shutdown(wait=wait)
+        with self._cpu_lock:
+            if self._cpu_pool is not None:
+                self._cpu_pool.shutdown(wait=wait)
+                self._cpu_pool = None
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+        return _job_manager
@@ -1,89 +1,296 @@
-import spacy
-from transformers import pipeline
+import os
 import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from keybert import KeyBERT
-from sentence_transformers import SentenceTransformer, util
-def extract_keypoints_improved(transcribed_text, num_key_points=20):
+from quiz_pipeline.model_registry import register_model, get_model
+from quiz_pipeline.config import (KEYPOINT_BATCH_SIZE, KEYPOINT_CHUNK_THRESHOLD_WORDS, KEYPOINT_CHUNK_WORDS,
+                                  KEYPOINT_CHUNK_OVERLAP, KEYPOINT_CHUNK_TOP_K, KEYPOINT_CHUNK_WORKERS, KEYPOINT_TIER,
+                                  FAST_KEYPOINT_DIVERSITY, KEYPOINT_BACKEND, ONNX_EXPORT_DIR)
+from quiz_pipeline.chunking import split_into_windows, ChunkRetriever
+from quiz_pipeline.embedding_index import EmbeddingIndex, normalize_rows
+from quiz_pipeline.metrics import stage_timer, bind
+
+QUESTION_GENERATOR = "question_generator"
+ANSWER_EXTRACTOR = "answer_extractor"
+FACT_SYNTHESIZER = "fact_synthesizer"
+KEYWORD_MODEL = "keybert"
+SIMILARITY_MODEL = "similarity"
+SPACY_MODEL = "spacy"
+
+KEYPOINT_MODELS = [QUESTION_GENERATOR, ANSWER_EXTRACTOR, FACT_SYNTHESIZER, KEYWORD_MODEL, SIMILARITY_MODEL, SPACY_MODEL]
+# the fast tier is purely extractive and never loads the generative or QA models
+FAST_KEYPOINT_MODELS = [KEYWORD_MODEL, SIMILARITY_MODEL, SPACY_MODEL]
+
+MODEL_IDS = {
+    QUESTION_GENERATOR: "mrm8488/t5-base-finetuned-question-generation-ap",
+    ANSWER_EXTRACTOR: "deepset/roberta-large-squad2",
+    FACT_SYNTHESIZER: "google/flan-t5-large",
+    SIMILARITY_MODEL: "all-MiniLM-L6-v2",
+    SPACY_MODEL: "en_core_web_sm",
+}
+# bump when the extraction logic changes so cached key points are not reused
+KEYPOINT_VERSION = 2
+
+MODEL_TASKS = {
+    QUESTION_GENERATOR: "text2text-generation",
+    ANSWER_EXTRACTOR: "question-answering",
+    FACT_SYNTHESIZER: "text2text-generation",
+}
+# optimum.onnxruntime classes for the onnx backend
+ONNX_MODEL_CLASSES = {
+    "text2text-generation": "ORTModelForSeq2SeqLM",
+    "question-answering": "ORTModelForQuestionAnswering",
+}
+INFERENCE_BACKENDS = ("torch", "int8", "onnx")
+
+# the heavy libraries are imported by the loaders, so importing this module stays cheap
+def _quantize_int8(model):
+    # dynamic int8 quantisation: weights of every Linear layer are stored as int8, activations stay float
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _onnx_export_dir(model_id):
+    return os.path.join(ONNX_EXPORT_DIR, model_id.replace("/", "--"))
+
+def _load_onnx(task, model_id):
+    try:
+        import optimum.onnxruntime as ort
+    except ImportError as e:
+        raise RuntimeError("KEYPOINT_BACKEND=onnx needs optimum with onnxruntime "
+                           "(pip install 'optimum[onnxruntime]')") from e
+    model_class = getattr(ort, ONNX_MODEL_CLASSES[task])
+    export_dir = _onnx_export_dir(model_id)
+    if os.path.isfile(os.path.join(export_dir, "config.json")):
+        return model_class.from_pretrained(export_dir)
+    # export once and keep it; the rename makes concurrent exports from several workers harmless
+    print(f"Exporting {model_id} to ONNX...")
+    model = model_class.from_pretrained(model_id, export=True)
+    os.makedirs(ONNX_EXPORT_DIR, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix="export_", dir=ONNX_EXPORT_DIR)
+    model.save_pretrained(staging_dir)
+    try:
+        os.replace(staging_dir, export_dir)
+    except OSError:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return model
+
+def _hf_pipeline(task, name, backend=None):
+    from transformers import pipeline
+    backend = backend or KEYPOINT_BACKEND
+    model_id = MODEL_IDS[name]
+    if backend == "onnx":
+        from transformers import AutoTokenizer
+        return pipeline(task, model=_load_onnx(task, model_id), tokenizer=AutoTokenizer.from_pretrained(model_id))
+    pipe = pipeline(task, model=model_id)
+    if backend == "int8":
+        pipe.model = _quantize_int8(pipe.model)
+    return pipe
+
+def _load_sentence_transformer(backend=None):
+    from sentence_transformers import SentenceTransformer
+    backend = backend or KEYPOINT_BACKEND
+    if backend == "onnx":
+        # sentence-transformers exports and runs the encoder through onnxruntime itself
+        return SentenceTransformer(MODEL_IDS[SIMILARITY_MODEL], backend="onnx")
+    model = SentenceTransformer(MODEL_IDS[SIMILARITY_MODEL])
+    return _quantize_int8(model) if backend == "int8" else model
+
+def load_model(name, backend=None):
+    # builds a fresh instance outside the registry, e.g. to compare two backends side by side
+    backend = backend or KEYPOINT_BACKEND
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if name == SIMILARITY_MODEL:
+        return _load_sentence_transformer(backend)
+    return _hf_pipeline(MODEL_TASKS[name], name, backend)
+
+def _load_keybert():
+    from keybert import KeyBERT
+    # share the MiniLM encoder instead of letting KeyBERT load its own copy
+    return KeyBERT(model=get_model(SIMILARITY_MODEL))
+
+def _load_spacy():
+    import spacy
+    return spacy.load(MODEL_IDS[SPACY_MODEL])
+
+def _download_hf(repo_id):
+    from huggingface_hub import snapshot_download
+    snapshot_download(repo_id)
+
+def _download_transformer(name):
+    _download_hf(MODEL_IDS[name])
+    if KEYPOINT_BACKEND == "onnx":
+        # the export is the slow part of an onnx start-up, so image builds do it ahead of time
+        _load_onnx(MODEL_TASKS[name], MODEL_IDS[name])
+
+def _download_spacy():
+    import spacy
+    if not spacy.util.is_package(MODEL_IDS[SPACY_MODEL]):
+        spacy.cli.download(MODEL_IDS[SPACY_MODEL])
+
+register_model(QUESTION_GENERATOR, lambda: load_model(QUESTION_GENERATOR),
+               download=lambda: _download_transformer(QUESTION_GENERATOR))
+register_model(ANSWER_EXTRACTOR, lambda: load_model(ANSWER_EXTRACTOR),
+               download=lambda: _download_transformer(ANSWER_EXTRACTOR))
+register_model(FACT_SYNTHESIZER, lambda: load_model(FACT_SYNTHESIZER),
+               download=lambda: _download_transformer(FACT_SYNTHESIZER))
+register_model(SIMILARITY_MODEL, lambda: load_model(SIMILARITY_MODEL),
+               download=lambda: _download_hf(f"sentence-transformers/{MODEL_IDS[SIMILARITY_MODEL]}"))
+register_model(KEYWORD_MODEL, _load_keybert, download=lambda: _download_hf(f"sentence-transformers/{MODEL_IDS[SIMILARITY_MODEL]}"))
+register_model(SPACY_MODEL, _load_spacy, download=_download_spacy)
+
+def keypoint_cache_params(num_key_points=20, tier=None):
+    tier = tier or KEYPOINT_TIER
+    params = {"version": KEYPOINT_VERSION, "models": MODEL_IDS, "num_key_points": num_key_points,
+              "chunking": [KEYPOINT_CHUNK_THRESHOLD_WORDS, KEYPOINT_CHUNK_WORDS, KEYPOINT_CHUNK_OVERLAP,
+                           KEYPOINT_CHUNK_TOP_K]}
+    if KEYPOINT_BACKEND != "torch":
+        # quantised and onnx models do not reproduce the fp32 outputs exactly
+        params["backend"] = KEYPOINT_BACKEND
+    if tier != "full":
+        # the full tier keeps its original key so existing cache entries stay valid
+        params.update(tier=tier, models={name: MODEL_IDS[name] for name in FAST_KEYPOINT_MODELS if name in MODEL_IDS},
+                      diversity=FAST_KEYPOINT_DIVERSITY)
+    return params
+
+def _as_list(results):
+    # text2text pipelines return a bare dict or a list of dicts depending on num_return_sequences
+    if results is None:
+        return []
+    if isinstance(results, dict):
+        return [results]
+    return results
+
+def _input_length(item):
+    if isinstance(item, dict):
+        return len(item.get("question", "")) + len(item.get("context", ""))
+    return len(item)
+
+def run_batched(pipe, inputs, batch_size, **kwargs):
+    # sort by length so every padded batch holds similar-sized inputs, then restore the input order
+    outputs = [None] * len(inputs)
+    order = sorted(range(len(inputs)), key=lambda i: _input_length(inputs[i]))
+    for start in range(0, len(order), batch_size):
+        indices = order[start:start + batch_size]
+        batch = [inputs[i] for i in indices]
+        try:
+            results = pipe(batch, batch_size=len(batch), **kwargs)
+            # the QA pipeline unwraps single-item batches
+            if isinstance(results, dict):
+                results = [results]
+        except Exception:
+            # retry one at a time so a single bad input only loses itself
+            results = []
+            for item in batch:
+                try:
+                    results.append(pipe(item, **kwargs))
+                except Exception:
+                    results.append(None)
+        for i, result in zip(indices, results):
+            outputs[i] = result
+    return outputs
+
+def _tfidf_scores(sentences):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
+    tfidf_matrix = vectorizer.fit_transform(sentences)
+    return np.array(tfidf_matrix.sum(axis=1)).flatten()
+
+def _score_sentences(sentences, limit):
+    # score sentences by TF-IDF
+    if not sentences:
+        return []
+    sentence_scores = _tfidf_scores(sentences)
+    top_sentence_indices = sentence_scores.argsort()[-min(limit, len(sentences)):][::-1]
+    return [sentences[i] for i in top_sentence_indices]
+
+def _analyse_text(text, nlp, kw_model, sentence_limit=30):
+    with stage_timer("spacy") as span:
+        doc = nlp(text)
+        span["items"] = len(doc)
+
+    # extract key phrases 
+    with stage_timer("keybert") as span:
+        keybert_keywords = kw_model.extract_keywords(
+            text, 
+            keyphrase_ngram_range=(1, 3), 
+            stop_words='english',
+            top_n=30
+        )
+        span["items"] = len(keybert_keywords)
+
+    # larger meaningful chunks
+    sentences = [sent.text.strip() for sent in doc.sents if len(sent.text.split()) > 5]
+    return keybert_keywords, _score_sentences(sentences, sentence_limit)
+
+def _analyse_chunks(chunks, nlp, kw_model, workers, sentence_limit=30):
+    # map: analyse every window independently, only the best few sentences of each survive
+    per_chunk = max(3, -(-2 * sentence_limit // len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        analyses = list(executor.map(bind(lambda chunk: _analyse_text(chunk, nlp, kw_model, per_chunk)), chunks))
+
+    # reduce: keep the best score per keyword and re-rank the surviving sentences together
+    keyword_scores = {}
+    candidates = []
+    for keywords, sentences in analyses:
+        for keyword, score in keywords:
+            keyword_scores[keyword] = max(score, keyword_scores.get(keyword, 0))
+        candidates.extend(sentences)
+    keybert_keywords = sorted(keyword_scores.items(), key=lambda item: item[1], reverse=True)[:30]
+    return keybert_keywords, _score_sentences(list(dict.fromkeys(candidates)), sentence_limit)
+
+def extract_keypoints_improved(transcribed_text, num_key_points=20, batch_size=None, chunked=None, on_key_point=None):
+    batch_size = max(1, batch_size or KEYPOINT_BATCH_SIZE)
     try:
-        question_generator = pipeline("text2text-generation", model="mrm8488/t5-base-finetuned-question-generation-ap")
-        answer_extractor = pipeline("question-answering", model="deepset/roberta-large-squad2")
-        fact_synthesizer = pipeline("text2text-generation", model="google/flan-t5-large")
+        question_generator = get_model(QUESTION_GENERATOR)
+        answer_extractor = get_model(ANSWER_EXTRACTOR)
+        fact_synthesizer = get_model(FACT_SYNTHESIZER)
 
-        kw_model = KeyBERT()
-        similarity_model = SentenceTransformer('all-MiniLM-L6-v2')
-        
+        kw_model = get_model(KEYWORD_MODEL)
+        similarity_model = get_model(SIMILARITY_MODEL)
+        nlp = get_model(SPACY_MODEL)
     except Exception as e:
         print(f"Error loading AI models: {e}")
         return []
-    nlp = spacy.load('en_core_web_sm')
     
     # clean and preprocess text
     cleaned_text = re.sub(r'\s+', ' ', transcribed_text).strip()
-    doc = nlp(cleaned_text)
-    
-    # extract key phrases 
-    keybert_keywords = kw_model.extract_keywords(
-        cleaned_text, 
-        keyphrase_ngram_range=(1, 3), 
-        stop_words='english',
-        top_n=30
-    )
-    
-    # important noun phrases
-    important_phrases = []
-    for chunk in doc.noun_chunks:
-        if len(chunk.text.split()) >= 2 and len(chunk.text) < 25:
-            important_phrases.append(chunk.text.lower())
-    
-    # larger meaningful chunks
-    sentences = [sent.text.strip() for sent in doc.sents if len(sent.text.split()) > 5]
+    if chunked is None:
+        chunked = len(cleaned_text.split()) > KEYPOINT_CHUNK_THRESHOLD_WORDS
 
-    # score sentences by TF-IDF
-    vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
-    tfidf_matrix = vectorizer.fit_transform(sentences)
-    sentence_scores = np.array(tfidf_matrix.sum(axis=1)).flatten()
-    
-    # top sentences
-    top_sentence_indices = sentence_scores.argsort()[-min(30, len(sentences)):][::-1]
-    important_sentences = [sentences[i] for i in top_sentence_indices]
+    if chunked:
+        chunks = split_into_windows(cleaned_text, KEYPOINT_CHUNK_WORDS, KEYPOINT_CHUNK_OVERLAP)
+        print(f"--> Long input, extracting key points from {len(chunks)} chunks...")
+        keybert_keywords, important_sentences = _analyse_chunks(chunks, nlp, kw_model, KEYPOINT_CHUNK_WORKERS)
+        retriever = ChunkRetriever(chunks)
+        context_for = lambda question: retriever.context_for(question, KEYPOINT_CHUNK_TOP_K)
+    else:
+        keybert_keywords, important_sentences = _analyse_text(cleaned_text, nlp, kw_model)
+        context_for = lambda question: cleaned_text
     
     # generate questions from important only
+    sentence_prompts = [f"generate question: {sentence}" for sentence in important_sentences[:15]
+                        if len(sentence.split()) > 10]
+    print(f"--> Generating questions from {len(sentence_prompts)} important sentences...")
     generated_questions = []
-    print(f"--> Generating questions from {len(important_sentences)} important sentences...")
-    
-    for sentence in important_sentences[:15]:  
-        try:
-            if len(sentence.split()) > 10:  
-                results = question_generator(
-                    f"generate question: {sentence}",
-                    max_length=64,
-                    num_beams=5,
-                    num_return_sequences=2,
-                    early_stopping=True
-                )
-                generated_questions.extend([res['generated_text'].strip() for res in results])
-        except Exception:
-            continue
-    
-    # generate questions from key phrases
-    for keyword, score in keybert_keywords[:10]:
-        if score > 0.3:
-            try:
-                results = question_generator(
-                    f"generate question about {keyword[0]}",
-                    max_length=64,
-                    num_beams=3,
-                    num_return_sequences=1
-                )
-                generated_questions.extend([res['generated_text'].strip() for res in results])
-            except Exception:
-                continue
+    with stage_timer("question_generation") as span:
+        for results in run_batched(question_generator, sentence_prompts, batch_size,
+                                   max_length=64, num_beams=5, num_return_sequences=2, early_stopping=True):
+            generated_questions.extend(res['generated_text'].strip() for res in _as_list(results))
+
+        # generate questions from key phrases
+        keyword_prompts = [f"generate question about {keyword}" for keyword, score in keybert_keywords[:10] if score > 0.3]
+        for results in run_batched(question_generator, keyword_prompts, batch_size,
+                                   max_length=64, num_beams=3, num_return_sequences=1):
+            generated_questions.extend(res['generated_text'].strip() for res in _as_list(results))
+        span["items"] = len(generated_questions)
     
     # answer Extraction with higher threshold
     final_key_points = []
     seen_points = set()
+    redundancy_index = EmbeddingIndex(similarity_model, threshold=0.85)
     print(f"--> Extracting answers from {len(generated_questions)} questions...")
 
     question_priority = []
@@ -96,61 +303,153 @@ def extract_keypoints_improved(transcribed_text, num_key_points=20):
     
     # sort by importance
     question_priority.sort(key=lambda x: x[1], reverse=True)
-    
-    for question, _ in question_priority[:min(30, len(question_priority))]:
-        try:
-            qa_result = answer_extractor(question=question, context=cleaned_text)
+    ranked_questions = [question for question, _ in question_priority[:min(30, len(question_priority))]]
+
+    # work through the ranked questions one batch at a time so we can stop once enough facts are accepted
+    for wave_start in range(0, len(ranked_questions), batch_size):
+        wave = ranked_questions[wave_start:wave_start + batch_size]
+        qa_inputs = [{"question": q, "context": context_for(q)} for q in wave]
+        with stage_timer("qa") as span:
+            qa_results = run_batched(answer_extractor, qa_inputs, batch_size)
+            span["items"] = len(qa_results)
+
+        answered = []
+        for question, qa_result in zip(wave, qa_results):
+            if qa_result and qa_result['score'] > 0.55 and len(qa_result['answer'].split()) > 2:
+                answered.append((question, qa_result['answer']))
 
-            if qa_result['score'] > 0.55 and len(qa_result['answer'].split()) > 2:
-                answer = qa_result['answer']
-            
-                # fact synthesis prompt
-                prompt = f"""
+        # fact synthesis prompt
+        prompts = [f"""
                 Create a clear, factual statement based on this information:
                 Question: {question}
                 Answer: {answer}
 
                 Factual statement:
-                """
-                
-                synthesis_result = fact_synthesizer(
-                    prompt, 
-                    max_length=120,
-                    num_beams=3,
-                    temperature=0.3
-                )
-                
-                if synthesis_result:
-                    fact = synthesis_result[0]['generated_text'].strip()
-                    fact = fact.rstrip('?').strip()                    
-                    if len(fact) > 15 and fact not in seen_points:
-                        is_redundant = False
-                        if final_key_points:
-                            fact_embedding = similarity_model.encode([fact])
-                            existing_embeddings = similarity_model.encode(final_key_points)
-                            similarities = util.cos_sim(fact_embedding, existing_embeddings)[0]
-                            if any(sim > 0.85 for sim in similarities):
-                                is_redundant = True
-                        
-                        if not is_redundant:
-                            final_key_points.append(fact)
-                            seen_points.add(fact)
-                            
-                            if len(final_key_points) >= num_key_points:
-                                break
-                                
-        except Exception as e:
-            continue
+                """ for question, answer in answered]
+        with stage_timer("synthesis") as span:
+            synthesis_results = run_batched(fact_synthesizer, prompts, batch_size,
+                                            max_length=120, num_beams=3, temperature=0.3)
+            span["items"] = len(synthesis_results)
+
+        facts = []
+        for synthesis_result in synthesis_results:
+            synthesis_result = _as_list(synthesis_result)
+            if not synthesis_result:
+                continue
+            fact = synthesis_result[0]['generated_text'].strip()
+            fact = fact.rstrip('?').strip()
+            if len(fact) > 15 and fact not in seen_points:
+                facts.append(fact)
+
+        # one encoder call per wave, each candidate is then checked against the accepted facts only
+        with stage_timer("keypoint_dedup", items=len(facts)):
+            embeddings = redundancy_index.encode(facts)
+        for fact, embedding in zip(facts, embeddings):
+            if fact in seen_points or not redundancy_index.add_if_novel(fact, embedding):
+                continue
+            final_key_points.append(fact)
+            seen_points.add(fact)
+            if on_key_point is not None:
+                on_key_point(fact)
+
+            if len(final_key_points) >= num_key_points:
+                break
+
+        if len(final_key_points) >= num_key_points:
+            break
 
     if len(final_key_points) < num_key_points:
         for sentence in important_sentences:
             if len(sentence.split()) > 8 and sentence not in seen_points:
                 final_key_points.append(sentence)
                 seen_points.add(sentence)
+                if on_key_point is not None:
+                    on_key_point(sentence)
                 if len(final_key_points) >= num_key_points:
                     break
     
     print(f"-> Successfully extracted {len(final_key_points)} key points.")
     for i in final_key_points:
         print(f'Keypoint:',i)
-    return final_key_points[:num_key_points]
\ No newline at end of file
+    return final_key_points[:num_key_points]
+
+def _rank_sentences(sentences, keybert_keywords, embeddings):
+    # relevance in [0, 1]: tf-idf weight, coverage of the document's key phrases and closeness to the
+    # document centroid, each rescaled to [0, 1] so no single signal dominates
+    def rescale(values):
+        values = np.asarray(values, dtype=np.float32)
+        spread = values.max() - values.min()
+        return (values - values.min()) / spread if spread > 0 else np.ones_like(values)
+
+    tfidf = _tfidf_scores(sentences)
+    coverage = [sum(score for keyword, score in keybert_keywords if keyword.lower() in sentence.lower())
+                for sentence in sentences]
+    centrality = embeddings @ normalize_rows(embeddings.mean(axis=0))[0]
+    return (rescale(tfidf) + rescale(coverage) + rescale(centrality)) / 3
+
+def _select_diverse(sentences, relevance, embeddings, limit, diversity, redundancy=0.85):
+    # maximal marginal relevance: each pick trades relevance against similarity to the sentences already chosen
+    selected = []
+    similarity_to_selected = np.full(len(sentences), -1.0, dtype=np.float32)
+    available = np.ones(len(sentences), dtype=bool)
+    while len(selected) < limit and available.any():
+        scores = (1 - diversity) * relevance - diversity * np.maximum(similarity_to_selected, 0)
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        available[best] = False
+        if similarity_to_selected[best] > redundancy:
+            continue
+        selected.append(best)
+        similarity_to_selected = np.maximum(similarity_to_selected, embeddings @ embeddings[best])
+    return [sentences[i] for i in selected]
+
+def extract_keypoints_fast(transcribed_text, num_key_points=20, chunked=None, on_key_point=None,
+                           diversity=FAST_KEYPOINT_DIVERSITY):
+    # extractive tier: ranks the transcript's own sentences, no question generation, QA or synthesis
+    try:
+        kw_model = get_model(KEYWORD_MODEL)
+        similarity_model = get_model(SIMILARITY_MODEL)
+        nlp = get_model(SPACY_MODEL)
+    except Exception as e:
+        print(f"Error loading AI models: {e}")
+        return []
+
+    cleaned_text = re.sub(r'\s+', ' ', transcribed_text).strip()
+    if chunked is None:
+        chunked = len(cleaned_text.split()) > KEYPOINT_CHUNK_THRESHOLD_WORDS
+
+    # a few times more candidates than key points, so the diversity step has something to choose from
+    candidate_limit = 3 * num_key_points
+    if chunked:
+        chunks = split_into_windows(cleaned_text, KEYPOINT_CHUNK_WORDS, KEYPOINT_CHUNK_OVERLAP)
+        print(f"--> Long input, ranking sentences from {len(chunks)} chunks...")
+        keybert_keywords, candidates = _analyse_chunks(chunks, nlp, kw_model, KEYPOINT_CHUNK_WORKERS,
+                                                       sentence_limit=candidate_limit)
+    else:
+        keybert_keywords, candidates = _analyse_text(cleaned_text, nlp, kw_model, sentence_limit=candidate_limit)
+
+    candidates = [sentence for sentence in dict.fromkeys(candidates) if len(sentence.split()) > 8]
+    if not candidates:
+        return []
+
+    print(f"--> Ranking {len(candidates)} candidate sentences...")
+    with stage_timer("sentence_ranking", items=len(candidates)):
+        embeddings = normalize_rows(similarity_model.encode(candidates, convert_to_numpy=True))
+        relevance = _rank_sentences(candidates, keybert_keywords, embeddings)
+        final_key_points = _select_diverse(candidates, relevance, embeddings, num_key_points, diversity)
+
+    for key_point in final_key_points if on_key_point is not None else []:
+        on_key_point(key_point)
+    print(f"-> Successfully extracted {len(final_key_points)} key points.")
+    return final_key_points
+
+KEYPOINT_TIERS = {
+    "full": extract_keypoints_improved,
+    "fast": extract_keypoints_fast,
+}
+
+def extract_keypoints(transcribed_text, tier=None, **kwargs):
+    tier = tier or KEYPOINT_TIER
+    if tier not in KEYPOINT_TIERS:
+        raise ValueError(f"Unknown key-point tier: {tier}")
+    return KEYPOINT_TIERS[tier](transcribed_text, **kwargs)
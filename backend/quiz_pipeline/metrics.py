@@ -0,0 +1,211 @@
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+import psutil
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# upper bounds (seconds) of the stage latency histogram
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_current_trace = contextvars.ContextVar("quiz_trace", default=None)
+
+
+def rss_bytes():
+    # looked up per call so forked workers report their own pid
+    return psutil.Process().memory_info().rss
+
+
+def peak_rss_bytes():
+    # high-water mark of the whole process, not of the stage alone
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss)
+
+
+class Trace:
+    # spans recorded while handling a single request, returned to the client when it asks for them.
+    # a trace opened inside another one also forwards its spans to the outer trace.
+
+    def __init__(self, parent=None):
+        self.started_at = time.time()
+        self.parent = parent
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+        if self.parent is not None:
+            self.parent.add(span)
+
+    def as_dict(self):
+        with self._lock:
+            spans = [dict(span) for span in self.spans]
+        stages = {}
+        for span in spans:
+            totals = stages.setdefault(span["stage"], {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "items": 0})
+            totals["calls"] += 1
+            totals["wall_seconds"] = round(totals["wall_seconds"] + span["wall_seconds"], 4)
+            totals["cpu_seconds"] = round(totals["cpu_seconds"] + span["cpu_seconds"], 4)
+            totals["items"] += span["items"] or 0
+        return {"total_seconds": round(time.time() - self.started_at, 4), "stages": stages, "spans": spans}
+
+
+class StageMetrics:
+    # process-wide aggregates per stage, rendered in the Prometheus text format
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, span):
+        with self._lock:
+            stage = self._stages.get(span["stage"])
+            if stage is None:
+                stage = self._stages[span["stage"]] = {
+                    "count": 0, "errors": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "items": 0,
+                    "peak_rss_bytes": 0, "buckets": [0] * len(self.buckets),
+                }
+            stage["count"] += 1
+            stage["errors"] += 1 if span["error"] else 0
+            stage["wall_seconds"] += span["wall_seconds"]
+            stage["cpu_seconds"] += span["cpu_seconds"]
+            stage["items"] += span["items"] or 0
+            stage["peak_rss_bytes"] = max(stage["peak_rss_bytes"], span["peak_rss_bytes"])
+            for i, bound in enumerate(self.buckets):
+                if span["wall_seconds"] <= bound:
+                    stage["buckets"][i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stage, buckets=list(stage["buckets"])) for name, stage in self._stages.items()}
+
+
+stage_metrics = StageMetrics()
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def collect_trace():
+    trace = Trace(parent=current_trace())
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record_span(span):
+    stage_metrics.record(span)
+    trace = current_trace()
+    if trace is not None:
+        trace.add(span)
+
+
+@contextmanager
+def stage_timer(stage, items=None):
+    # cpu time is process-wide, so it includes whatever else the process ran concurrently
+    span = {"stage": stage, "started_at": round(time.time(), 4), "items": items, "error": False}
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield span
+    except Exception:
+        span["error"] = True
+        raise
+    finally:
+        span["wall_seconds"] = round(time.perf_counter() - wall_start, 4)
+        span["cpu_seconds"] = round(time.process_time() - cpu_start, 4)
+        span["rss_bytes"] = rss_bytes()
+        span["peak_rss_bytes"] = peak_rss_bytes()
+        span["pid"] = os.getpid()
+        record_span(span)
+
+
+def bind(fn):
+    # run fn in a copy of the caller's context so spans from executor threads reach the request's trace
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+def run_traced(fn, *args, **kwargs):
+    # executed in a worker process: returns the spans alongside the result so the parent can merge them
+    with collect_trace() as trace:
+        result = fn(*args, **kwargs)
+    return result, trace.spans
+
+
+def merge_spans(spans):
+    for span in spans:
+        record_span(span)
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(cache_stats=None, job_stats=None):
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+
+    stages = sorted(stage_metrics.snapshot().items())
+    histogram = []
+    for name, stage in stages:
+        for bound, count in zip(stage_metrics.buckets, stage["buckets"]):
+            histogram.append(({"stage": name, "le": bound}, count))
+        histogram.append(({"stage": name, "le": "+Inf"}, stage["count"]))
+    lines.append("# HELP quiz_stage_seconds Wall time per pipeline stage.")
+    lines.append("# TYPE quiz_stage_seconds histogram")
+    for labels, value in histogram:
+        lines.append(f"quiz_stage_seconds_bucket{_labels(**labels)} {value}")
+    for name, stage in stages:
+        lines.append(f"quiz_stage_seconds_sum{_labels(stage=name)} {round(stage['wall_seconds'], 4)}")
+        lines.append(f"quiz_stage_seconds_count{_labels(stage=name)} {stage['count']}")
+
+    metric("quiz_stage_cpu_seconds_total", "counter", "Process CPU time spent while a stage ran.",
+           [({"stage": name}, round(stage["cpu_seconds"], 4)) for name, stage in stages])
+    metric("quiz_stage_items_total", "counter", "Items produced per stage (segments, key points, questions...).",
+           [({"stage": name}, stage["items"]) for name, stage in stages])
+    metric("quiz_stage_errors_total", "counter", "Stage runs that raised.",
+           [({"stage": name}, stage["errors"]) for name, stage in stages])
+    metric("quiz_stage_peak_rss_bytes", "gauge", "Process peak RSS observed at the end of a stage.",
+           [({"stage": name}, stage["peak_rss_bytes"]) for name, stage in stages])
+    metric("quiz_process_rss_bytes", "gauge", "Current resident set size.", [({}, rss_bytes())])
+    metric("quiz_process_peak_rss_bytes", "gauge", "Peak resident set size.", [({}, peak_rss_bytes())])
+
+    if cache_stats:
+        samples = []
+        for stage, counters in sorted(cache_stats.get("stages", {}).items()):
+            for outcome, value in sorted(counters.items()):
+                samples.append(({"stage": stage, "outcome": outcome}, value))
+        metric("quiz_cache_events_total", "counter", "Result cache hits, misses and writes.", samples)
+        if cache_stats.get("total_bytes") is not None:
+            metric("quiz_cache_bytes", "gauge", "Bytes held by the result cache.", [({}, cache_stats["total_bytes"])])
+    if job_stats:
+        metric("quiz_jobs", "gauge", "Background jobs by status.",
+               [({"status": status}, count) for status, count in sorted(job_stats.get("jobs", {}).items())])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _process_rss_bytes():
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except Exception:
+        return None
+
+
+def _param_bytes(model):
+    # pipelines keep the torch module on .model, sentence-transformers/whisper are modules themselves
+    module = getattr(model, 'model', model)
+    parameters = getattr(module, 'parameters', None)
+    if not callable(parameters):
+        return None
+    try:
+        return sum(p.numel() * p.element_size() for p in parameters())
+    except Exception:
+        return None
+
+
+class ModelRegistry:
+    # loads each registered model at most once per process and shares it between requests
+
+    def __init__(self):
+        self._loaders = {}
+        self._downloaders = {}
+        self._models = {}
+        self._stats = {}
+        self._failures = {}
+        self._warm_up_thread = None
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def register(self, name, loader, download=None):
+        # download fetches the weights without loading them; models without one are downloaded by loading
+        with self._lock:
+            self._loaders[name] = loader
+            self._downloaders[name] = download
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def names(self):
+        with self._lock:
+            return list(self._loaders)
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"Unknown model: {name}")
+            loader = self._loaders[name]
+            load_lock = self._load_locks[name]
+
+        with load_lock:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            logger.info(f"-> Loading model '{name}'...")
+            rss_before = _process_rss_bytes()
+            started = time.perf_counter()
+            try:
+                model = loader()
+            except Exception as e:
+                self._failures[name] = str(e)
+                raise
+            self._failures.pop(name, None)
+            load_seconds = time.perf_counter() - started
+            rss_after = _process_rss_bytes()
+
+            self._stats[name] = {
+                "load_seconds": round(load_seconds, 3),
+                "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                "param_bytes": _param_bytes(model),
+                "loaded_at": time.time(),
+                "pid": os.getpid(),
+            }
+            self._models[name] = model
+            logger.info(f"---> Model '{name}' loaded in {load_seconds:.1f}s.")
+            return model
+
+    def resolve(self, names=None):
+        if not names or names == ["all"]:
+            return self.names()
+        return list(names)
+
+    def warm_up(self, names=None):
+        failed = {}
+        for name in self.resolve(names):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Failed to warm up model '{name}': {e}", exc_info=True)
+                failed[name] = str(e)
+        return failed
+
+    def start_warm_up(self, names=None):
+        # loads in the background so the process can answer health checks (and PDF requests) meanwhile
+        self._warm_up_thread = threading.Thread(target=self.warm_up, args=(names,), name="model-warm-up", daemon=True)
+        self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    def download(self, name):
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"Unknown model: {name}")
+            downloader = self._downloaders.get(name)
+        if downloader is not None:
+            downloader()
+        else:
+            self.get(name)
+
+    def readiness(self, names=None):
+        # unlike warm_up, no names means nothing has to be loaded
+        names = self.names() if names == ["all"] else list(names or [])
+        loaded = [name for name in names if self.is_loaded(name)]
+        failed = {name: self._failures[name] for name in names if name in self._failures and name not in loaded}
+        warming = self._warm_up_thread is not None and self._warm_up_thread.is_alive()
+        return {
+            "ready": len(loaded) == len(names),
+            "warming": warming,
+            "loaded": loaded,
+            "pending": [name for name in names if name not in loaded and name not in failed],
+            "failed": failed,
+        }
+
+    def unload(self, name):
+        with self._lock:
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+
+    def stats(self):
+        models = {}
+        for name in self.names():
+            entry = {"loaded": self.is_loaded(name)}
+            entry.update(self._stats.get(name, {}))
+            models[name] = entry
+        return {"pid": os.getpid(), "process_rss_bytes": _process_rss_bytes(), "models": models}
+
+    def _reset_locks(self):
+        # a forked child must not inherit a lock held by another thread of the parent
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self._load_locks}
+
+
+registry = ModelRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry._reset_locks)
+
+
+def register_model(name, loader, download=None):
+    registry.register(name, loader, download)
+
+
+def get_model(name):
+    return registry.get(name)
+
+
+def warm_up(names=None):
+    return registry.warm_up(names)
+
+
+def start_warm_up(names=None):
+    return registry.start_warm_up(names)
+
+
+def readiness(names=None):
+    return registry.readiness(names)
+
+
+def model_stats():
+    return registry.stats()
@@ -1,55 +1,117 @@
 import os
+from concurrent.futures import ThreadPoolExecutor, BrokenExecutor, FIRST_COMPLETED, as_completed, wait
 from quiz_pipeline.video_processing import extract_audio_from_local_video
-from quiz_pipeline.transcription import transcribe_audio
-from quiz_pipeline.keypoint_extraction import extract_keypoints_improved
-from quiz_pipeline.quiz_generation import generate_quiz_with_gemini, parse_quiz_text
-import whisper
+from quiz_pipeline.transcription import (transcribe_audio_timed, transcription_cache_params, transcription_pool,
+                                         discard_transcription_pool)
+from quiz_pipeline.cache import get_cache, make_key, hash_file
+from quiz_pipeline.metrics import bind, run_traced, merge_spans
+from quiz_pipeline.serving import thread_budget
+from quiz_pipeline.config import DIRECTORY_CONCURRENCY
 
 ALLOWED_VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.webm', '.mov', '.avi'}
 
-try:
-    whisper_model = whisper.load_model('base')
-except Exception as e:
-    print(f"Failed to load Whisper model: {e}")
-    whisper_model = None
-
-def _process_single_video(video_path, model):
-    filename = os.path.basename(video_path)
-
-    if model is None:
-        return {"error": "Whisper model is not loaded."}
-
-    temp_audio_path = f"temp_{filename}.mp3"
-    audio_file = extract_audio_from_local_video(video_path, temp_audio_path)
-    if not audio_file:
-        return {"error": f"Audio extraction failed for {filename}"}
-
-    transcribed_text = ""
-    try:
-        transcribed_text = transcribe_audio(audio_file, model)
-    finally:
-        if os.path.exists(audio_file):
-            os.remove(audio_file)
+def _lookup_transcript(video_path):
+    # returns (cache key, cached transcript or None)
+    transcript_key = make_key(hash_file(video_path), transcription_cache_params())
+    cached_text = get_cache().get_json("transcript", transcript_key)
+    if cached_text is not None:
+        print(f"-> Using cached transcript for {os.path.basename(video_path)}")
+    return transcript_key, cached_text
+
+def _store_transcript(transcript_key, transcript):
+    if transcript and transcript["text"].strip():
+        get_cache().set_json("transcript", transcript_key, transcript["text"])
+        get_cache().set_json("transcript_segments", transcript_key, transcript["segments"])
+
+def _decode_and_transcribe(video_path, workers=None):
+    # returns ({"text", "segments"} or None, error); the audio track goes from the container to whisper
+    # as in-memory PCM
+    audio = extract_audio_from_local_video(video_path)
+    if audio is None:
+        return None, f"Audio extraction failed for {os.path.basename(video_path)}"
+    return transcribe_audio_timed(audio, workers=workers), None
+
+def _transcribe_video(video_path):
+    transcript_key, cached_text = _lookup_transcript(video_path)
+    if cached_text is not None:
+        return cached_text, None
+    transcript, error = _decode_and_transcribe(video_path)
+    _store_transcript(transcript_key, transcript)
+    return transcript["text"] if transcript else None, error
+
+def _single_video_transcript(video_path):
+    transcribed_text, error = _transcribe_video(video_path)
+    if error:
+        return {"error": error}
 
     if not transcribed_text or len(transcribed_text.strip()) == 0:
         return {"error": "Transcription failed or produced no text."}
-    key_points = extract_keypoints_improved(transcribed_text)
-    if not key_points:
-        return {"error": "Key point extraction failed."}
-
-    key_points_string = "\n- ".join(key_points)
-    raw_quiz_text = generate_quiz_with_gemini(key_points_string)
-    if not raw_quiz_text:
-        return {"error": "Quiz generation failed."}
-    
-    mcq_quiz, tf_quiz = parse_quiz_text(raw_quiz_text)
-    quiz_data = mcq_quiz + tf_quiz
-
-    return {"source_name": filename, "quiz_data": quiz_data}
 
-def _process_video_directory(directory_path, model):
-    all_transcriptions = []
-    
+    return {"text": transcribed_text, "source_name": os.path.basename(video_path)}
+
+def _directory_workers(max_workers=None):
+    return max(1, max_workers or DIRECTORY_CONCURRENCY or thread_budget() // 2)
+
+def _transcribe_videos(video_files, max_workers=None):
+    # returns one (transcript, error) pair per video, in the order of video_files
+    workers = _directory_workers(max_workers)
+    if workers == 1 or len(video_files) == 1:
+        results = []
+        for video_path in video_files:
+            print(f"Processing video in directory: {os.path.basename(video_path)}")
+            results.append(_transcribe_video(video_path))
+        return results
+
+    results = [(None, None)] * len(video_files)
+    # hashing and cache lookups run on threads; decoding and whisper run in the shared transcription pool,
+    # whose workers keep their model loaded between requests
+    print(f"Processing {len(video_files)} videos with {workers} workers...")
+    to_transcribe = []
+    with ThreadPoolExecutor(max_workers=min(workers, len(video_files))) as lookups:
+        looked_up = {lookups.submit(bind(_lookup_transcript), path): index for index, path in enumerate(video_files)}
+        for future in as_completed(looked_up):
+            index = looked_up[future]
+            try:
+                transcript_key, cached_text = future.result()
+            except Exception as e:
+                results[index] = (None, f"Could not read {os.path.basename(video_files[index])}: {e}")
+                continue
+            if cached_text is not None:
+                results[index] = (cached_text, None)
+            else:
+                to_transcribe.append((index, transcript_key))
+
+    with transcription_pool(workers) as transcribers:
+        # at most `workers` videos are decoded at once, even when other requests share the pool
+        transcribing = {}
+        while to_transcribe or transcribing:
+            while to_transcribe and len(transcribing) < workers:
+                index, transcript_key = to_transcribe.pop(0)
+                # the worker is already one of several processes, so it must not fan out again
+                future = transcribers.submit(run_traced, _decode_and_transcribe, video_files[index], workers=1)
+                transcribing[future] = (index, transcript_key)
+            done, _ = wait(transcribing, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, transcript_key = transcribing.pop(future)
+                try:
+                    (transcript, error), spans = future.result()
+                except BrokenExecutor as e:
+                    # a dead worker (usually OOM) breaks the whole pool; the next request starts a fresh one
+                    discard_transcription_pool(transcribers)
+                    # the videos not handed over yet fail with it; the ones in flight are collected as usual
+                    for index, _ in [(index, transcript_key)] + to_transcribe:
+                        results[index] = (None, f"Transcription worker failed: {e}")
+                    to_transcribe = []
+                    continue
+                except Exception as e:
+                    results[index] = (None, f"Transcription worker failed: {e}")
+                    continue
+                merge_spans(spans)
+                _store_transcript(transcript_key, transcript)
+                results[index] = (transcript["text"] if transcript else None, error)
+    return results
+
+def _directory_transcript(directory_path, max_workers=None):
     video_files = [
         os.path.join(directory_path, f) for f in sorted(os.listdir(directory_path))
         if os.path.isfile(os.path.join(directory_path, f)) and os.path.splitext(f)[1].lower() in ALLOWED_VIDEO_EXTENSIONS
@@ -57,52 +119,34 @@ def _process_video_directory(directory_path, model):
 
     if not video_files:
         return {"error": f"No supported video files found in directory: {os.path.basename(directory_path)}"}
-        
-    if model is None:
-        return {"error": "Whisper model is not loaded."}
-
-    for video_path in video_files:
-        print(f"Processing video in directory: {os.path.basename(video_path)}")
-        temp_audio_path = f"temp_{os.path.basename(video_path)}.mp3"
-        audio_file = extract_audio_from_local_video(video_path, temp_audio_path)
-        
-        if not audio_file:
-            print(f"Warning: Could not extract audio from {os.path.basename(video_path)}")
-            continue
-
-        try:
-            transcribed_text = transcribe_audio(audio_file, model)
-            if transcribed_text:
-                all_transcriptions.append(transcribed_text)
-        finally:
-            if os.path.exists(audio_file):
-                os.remove(audio_file)
+
+    all_transcriptions = []
+    failures = []
+    for video_path, (transcribed_text, error) in zip(video_files, _transcribe_videos(video_files, max_workers)):
+        filename = os.path.basename(video_path)
+        if error:
+            print(f"Warning: {error}")
+            failures.append({"file": filename, "error": error})
+        elif not transcribed_text or not transcribed_text.strip():
+            failures.append({"file": filename, "error": "Transcription failed or produced no text."})
+        else:
+            all_transcriptions.append(transcribed_text)
 
     if not all_transcriptions:
-        return {"error": "Could not transcribe any videos in the directory."}
+        return {"error": "Could not transcribe any videos in the directory.", "failures": failures}
 
     combined_text = "\n\n--- End of Video ---\n\n".join(all_transcriptions)
-    key_points = extract_keypoints_improved(combined_text)
-    if not key_points:
-        return {"error": "Key point extraction failed for the combined video content."}
-
-    key_points_string = "\n- ".join(key_points)
-    raw_quiz_text = generate_quiz_with_gemini(key_points_string)
-    if not raw_quiz_text:
-        return {"error": "Combined quiz generation failed."}
-
-    mcq_quiz, tf_quiz = parse_quiz_text(raw_quiz_text)
-    
     source_name = f"Combined Quiz from directory: {os.path.basename(directory_path)}"
-    return {"source_name": source_name, "quiz_data": mcq_quiz + tf_quiz}
+    return {"text": combined_text, "source_name": source_name, "failures": failures}
 
-def process_local_path(path):
+def local_path_transcript(path, max_workers=None):
+    # returns {"text", "source_name"} (plus "failures" for directories) or {"error"}
     if os.path.isdir(path): 
-        return _process_video_directory(path, whisper_model)
+        return _directory_transcript(path, max_workers=max_workers)
     elif os.path.isfile(path): 
         file_ext = os.path.splitext(path)[1].lower()
         if file_ext not in ALLOWED_VIDEO_EXTENSIONS:
             return {"error": f"Unsupported file type: {file_ext}. Only video files are processed."}
-        return _process_single_video(path, whisper_model)
+        return _single_video_transcript(path)
     else:
-        return {"error": f"The provided path does not exist or is not a valid file/directory: {path}"}
\ No newline at end of file
+        return {"error": f"The provided path does not exist or is not a valid file/directory: {path}"}
@@ -1,18 +1,97 @@
 import fitz 
 import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from quiz_pipeline.config import (PDF_MAX_BYTES, PDF_MAX_PAGES, PDF_WORKERS, PDF_PARALLEL_MIN_PAGES,
+                                  PDF_PAGES_PER_TASK, WORKER_START_METHOD)
 
 logger = logging.getLogger(__name__)
 
-def extract_text_from_pdf(file_stream):
+class PdfLimitError(Exception):
+    pass
+
+def _format_size(size):
+    # limits below a megabyte are reported in KB instead of rounding down to "0 MB"
+    if size >= 1024 ** 2:
+        return f"{round(size / 1024 ** 2, 1):g} MB"
+    return f"{round(size / 1024, 1):g} KB"
+
+def spool_upload(file_stream, max_bytes=PDF_MAX_BYTES, chunk_size=1024 * 1024, directory=None):
+    # copies an upload to a temp file in chunks so the whole document never sits in memory
+    fd, pdf_path = tempfile.mkstemp(suffix='.pdf', dir=directory)
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file_stream.read(chunk_size), b''):
+                written += len(chunk)
+                if max_bytes and written > max_bytes:
+                    raise PdfLimitError(f"PDF exceeds the {_format_size(max_bytes)} upload limit.")
+                out.write(chunk)
+    except BaseException:
+        os.remove(pdf_path)
+        raise
+    return pdf_path
+
+def _extract_page_range(pdf_path, start, end):
+    with fitz.open(pdf_path) as doc:
+        return [(page_number + 1, doc[page_number].get_text()) for page_number in range(start, end)]
+
+def iter_pdf_pages(pdf_path, max_pages=PDF_MAX_PAGES, workers=PDF_WORKERS):
+    # yields (page number, text) in document order, fanning page ranges out to worker processes for big files
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    if max_pages and page_count > max_pages:
+        raise PdfLimitError(f"PDF has {page_count} pages, the limit is {max_pages}.")
+
+    if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                yield page.number + 1, page.get_text()
+        return
+
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count)) for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    context = multiprocessing.get_context(WORKER_START_METHOD) if WORKER_START_METHOD else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        # only keep a few ranges in flight so finished pages do not pile up ahead of the consumer
+        window = workers * 2
+        pending = [executor.submit(_extract_page_range, pdf_path, start, end) for start, end in ranges[:window]]
+        next_range = window
+        while pending:
+            pages = pending.pop(0).result()
+            if next_range < len(ranges):
+                start, end = ranges[next_range]
+                pending.append(executor.submit(_extract_page_range, pdf_path, start, end))
+                next_range += 1
+            yield from pages
+
+PAGE_SEPARATOR = "\f"
+
+def extract_text_from_pdf_path(pdf_path):
+    # pages are joined with a form feed, so page n of the document is text.split(PAGE_SEPARATOR)[n - 1]
     try:
-        logger.info("-> Opening PDF from stream...")
-        doc = fitz.open(stream=file_stream.read(), filetype="pdf")
-        full_text = ""
-        for page in doc:
-            full_text += page.get_text()
-        doc.close()
+        logger.info("-> Extracting text from PDF...")
+        # iter_pdf_pages yields every page in document order, so an empty page still keeps its slot
+        text = PAGE_SEPARATOR.join(page_text.replace(PAGE_SEPARATOR, " ") for _, page_text in iter_pdf_pages(pdf_path))
         logger.info("---> PDF text extraction successful.")
-        return full_text
+        return text
+    except PdfLimitError:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing PDF file: {e}", exc_info=True)
+        return ""
+
+def extract_text_from_pdf(file_stream):
+    logger.info("-> Opening PDF from stream...")
+    try:
+        pdf_path = spool_upload(file_stream)
+    except PdfLimitError:
+        raise
     except Exception as e:
         logger.error(f"Error processing PDF file stream: {e}", exc_info=True)
         return ""
+    try:
+        return extract_text_from_pdf_path(pdf_path)
+    finally:
+        os.remove(pdf_path)
@@ -0,0 +1,264 @@
+import logging
+from quiz_pipeline.video_processing import extract_audio_from_url
+from quiz_pipeline.pdf_processing import extract_text_from_pdf, extract_text_from_pdf_path, PdfLimitError
+from quiz_pipeline.transcription import transcribe_audio_timed, transcription_cache_params
+from quiz_pipeline.os_video_handler import local_path_transcript
+from quiz_pipeline.keypoint_extraction import extract_keypoints, keypoint_cache_params, SIMILARITY_MODEL
+from quiz_pipeline.quiz_generation import generate_quiz, quiz_cache_params
+from quiz_pipeline.cache import get_cache, make_key, hash_text, normalize_url
+from quiz_pipeline.embedding_index import EmbeddingIndex
+from quiz_pipeline.model_registry import get_model
+from quiz_pipeline.metrics import stage_timer, run_traced, merge_spans
+from quiz_pipeline.workspace import load_checkpoint, save_checkpoint, scratch_dir, discard_scratch_dir
+from quiz_pipeline.config import QUIZ_DEDUP_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+def report(progress, stage, status, **data):
+    if progress is None:
+        return
+    try:
+        progress(stage, status, **data)
+    except Exception as e:
+        logger.warning(f"Progress callback failed for stage '{stage}': {e}")
+
+
+def run_cpu_bound(cpu, fn, *args, **kwargs):
+    # cpu is an optional executor hook (e.g. a process pool) for the heavy model stages
+    if cpu is None:
+        return fn(*args, **kwargs)
+    # spans recorded in the worker come back with the result so this process can report them
+    result, spans = cpu(run_traced, fn, *args, **kwargs)
+    merge_spans(spans)
+    return result
+
+
+def question_filter(threshold=QUIZ_DEDUP_THRESHOLD):
+    # returns is_novel(item) for generate_quiz, or None when the similarity model cannot be loaded
+    try:
+        index = EmbeddingIndex(get_model(SIMILARITY_MODEL), threshold=threshold)
+    except Exception as e:
+        logger.warning(f"Skipping duplicate question filtering: {e}")
+        return None
+
+    def is_novel(item):
+        with stage_timer("quiz_dedup", items=1):
+            return index.add_if_novel(item["question"])
+
+    return is_novel
+
+
+def is_live(progress, cpu):
+    # callbacks only work in-process, so partial results are reported only when no executor hook is used
+    return progress is not None and cpu is None
+
+
+def keypoints_from_text(text, progress=None, cpu=None, tier=None):
+    # the model stage of quiz_from_text; returns None when no key points could be extracted
+    cache = get_cache()
+    live = is_live(progress, cpu)
+
+    report(progress, "keypoints", "running")
+    keypoint_key = make_key(hash_text(text), keypoint_cache_params(tier=tier))
+    # a checkpoint from an earlier attempt of this run wins, it survives cache eviction and CACHE_ENABLED=false
+    key_points = load_checkpoint("keypoints") or cache.get_json("keypoints", keypoint_key)
+    cached = key_points is not None
+    if cached:
+        for key_point in key_points if live else []:
+            report(progress, "keypoints", "item", key_point=key_point)
+    else:
+        on_key_point = (lambda key_point: report(progress, "keypoints", "item", key_point=key_point)) if live else None
+        with stage_timer("keypoint_extraction") as span:
+            key_points = run_cpu_bound(cpu, extract_keypoints, text, tier=tier, on_key_point=on_key_point)
+            span["items"] = len(key_points)
+        if key_points:
+            cache.set_json("keypoints", keypoint_key, key_points)
+    if not key_points:
+        report(progress, "keypoints", "failed")
+        return None
+    save_checkpoint("keypoints", key_points)
+    report(progress, "keypoints", "done", count=len(key_points), cached=cached)
+    return key_points
+
+
+def quiz_from_keypoints(key_points, source_name, progress=None, regenerate=False, live=False):
+    # the Gemini stage of quiz_from_text; only network-bound, so it never goes through the cpu hook
+    cache = get_cache()
+
+    report(progress, "quiz_generation", "running")
+    key_points_text = "\n- ".join(key_points)
+    quiz_key = make_key(hash_text(key_points_text), quiz_cache_params(streamed=live))
+    # regenerating asks Gemini for a fresh quiz but still reuses every upstream stage
+    quiz_data = load_checkpoint("quiz") or (None if regenerate else cache.get_json("quiz", quiz_key))
+    cached = quiz_data is not None
+    errors = []
+    if cached:
+        for item in quiz_data if live else []:
+            report(progress, "quiz_generation", "item", question=item)
+    else:
+        with stage_timer("quiz_generation") as span:
+            # near-duplicates are turned away as they arrive, so generate_quiz asks for replacements
+            is_novel = question_filter()
+            if live:
+                quiz_data = []
+
+                def on_question(item):
+                    quiz_data.append(item)
+                    report(progress, "quiz_generation", "item", question=item)
+
+                _, _, errors = generate_quiz(key_points_text, on_question=on_question, is_novel=is_novel)
+            else:
+                mcq, tf, errors = generate_quiz(key_points_text, is_novel=is_novel)
+                quiz_data = mcq + tf
+            span["items"] = len(quiz_data)
+            # the questions gemini got wrong (and why) travel with the request's trace
+            span["rejected"] = errors
+    if not quiz_data:
+        report(progress, "quiz_generation", "failed", rejected=len(errors))
+        return {"error": "Quiz generation failed."}
+    if not cached:
+        cache.set_json("quiz", quiz_key, quiz_data)
+    save_checkpoint("quiz", quiz_data)
+    report(progress, "quiz_generation", "done", count=len(quiz_data), cached=cached, rejected=len(errors))
+
+    return {"source_name": source_name, "quiz_data": quiz_data}
+
+
+def quiz_from_text(text, source_name, progress=None, cpu=None, regenerate=False, tier=None):
+    key_points = keypoints_from_text(text, progress=progress, cpu=cpu, tier=tier)
+    if not key_points:
+        return {"error": "Key point extraction failed."}
+    return quiz_from_keypoints(key_points, source_name, progress=progress, regenerate=regenerate,
+                               live=is_live(progress, cpu))
+
+
+def _download_audio(url_key, source, output_dir):
+    cache = get_cache()
+    audio_key = make_key(url_key)
+    audio_file = cache.get_file("audio", audio_key, ".audio")
+    if audio_file:
+        return audio_file
+    audio_file = extract_audio_from_url(source, output_dir)
+    if not audio_file:
+        return None
+    return cache.put_file("audio", audio_key, audio_file, ".audio")
+
+
+def cached_url_transcript(source):
+    # returns (url_key, transcript_key, text); text is None when the URL has not been transcribed yet
+    url_key = normalize_url(source)
+    transcript_key = make_key(url_key, transcription_cache_params())
+    return url_key, transcript_key, load_checkpoint("transcript") or get_cache().get_json("transcript", transcript_key)
+
+
+def download_url_audio(source, url_key, download_dir, progress=None):
+    report(progress, "download", "running")
+    audio_file = _download_audio(url_key, source, download_dir)
+    report(progress, "download", "done" if audio_file else "failed")
+    return audio_file
+
+
+def transcribe_url_audio(audio_file, transcript_key, progress=None, cpu=None):
+    report(progress, "transcription", "running")
+    on_segment = (lambda segment: report(progress, "transcription", "item", segment=segment)) \
+        if is_live(progress, cpu) else None
+    transcript = run_cpu_bound(cpu, transcribe_audio_timed, audio_file, on_segment=on_segment)
+    transcribed_text = transcript["text"] if transcript else ""
+    if not transcribed_text:
+        report(progress, "transcription", "failed")
+        return None
+    # the timestamped segments are kept next to the text under the same key
+    get_cache().set_json("transcript", transcript_key, transcribed_text)
+    get_cache().set_json("transcript_segments", transcript_key, transcript["segments"])
+    save_checkpoint("transcript", transcribed_text)
+    report(progress, "transcription", "done", characters=len(transcribed_text), cached=False)
+    return transcribed_text
+
+
+def process_url(source, progress=None, cpu=None, regenerate=False, tier=None):
+    url_key, transcript_key, transcribed_text = cached_url_transcript(source)
+    if transcribed_text is not None:
+        report(progress, "transcription", "done", characters=len(transcribed_text), cached=True)
+    else:
+        # in a job workspace the download outlives a failed transcription, so a retry does not fetch it again
+        with scratch_dir("download") as download_dir:
+            audio_file = download_url_audio(source, url_key, download_dir, progress)
+            if not audio_file:
+                return {"error": "Failed to download or extract audio from URL."}
+            transcribed_text = transcribe_url_audio(audio_file, transcript_key, progress, cpu)
+            if not transcribed_text:
+                return {"error": "Transcription failed for the URL."}
+            discard_scratch_dir(download_dir)
+
+    return quiz_from_text(transcribed_text, source, progress=progress, cpu=cpu, regenerate=regenerate, tier=tier)
+
+
+def process_pdf(file_stream, filename, progress=None, cpu=None, regenerate=False, tier=None):
+    report(progress, "pdf_extraction", "running")
+    with stage_timer("pdf_extraction"):
+        text = extract_text_from_pdf(file_stream)
+    return _quiz_from_pdf_text(text, filename, progress, cpu, regenerate, tier)
+
+
+def pdf_file_text(pdf_path, progress=None, cpu=None):
+    # returns (text, error); error is set when the PDF is over the limits or holds no text
+    text = load_checkpoint("pdf_text")
+    if text is not None:
+        report(progress, "pdf_extraction", "done", characters=len(text), cached=True)
+        return text, None
+    report(progress, "pdf_extraction", "running")
+    try:
+        with stage_timer("pdf_extraction"):
+            text = run_cpu_bound(cpu, extract_text_from_pdf_path, pdf_path)
+    except PdfLimitError as e:
+        report(progress, "pdf_extraction", "failed")
+        return None, str(e)
+    if not text or not text.strip():
+        report(progress, "pdf_extraction", "failed")
+        return None, "Could not extract any text from the PDF."
+    save_checkpoint("pdf_text", text)
+    report(progress, "pdf_extraction", "done", characters=len(text))
+    return text, None
+
+
+def process_pdf_file(pdf_path, filename, progress=None, cpu=None, regenerate=False, tier=None):
+    text, error = pdf_file_text(pdf_path, progress, cpu)
+    if error:
+        return {"error": error}
+    return quiz_from_text(text, filename, progress=progress, cpu=cpu, regenerate=regenerate, tier=tier)
+
+
+def _quiz_from_pdf_text(text, filename, progress, cpu, regenerate, tier):
+    if not text or not text.strip():
+        report(progress, "pdf_extraction", "failed")
+        return {"error": "Could not extract any text from the PDF."}
+    report(progress, "pdf_extraction", "done", characters=len(text))
+    return quiz_from_text(text, filename, progress=progress, cpu=cpu, regenerate=regenerate, tier=tier)
+
+
+def local_transcript(path, progress=None, cpu=None):
+    transcript = load_checkpoint("local_transcript")
+    if transcript is not None:
+        report(progress, "local_video", "done", cached=True)
+        return transcript
+    report(progress, "local_video", "running")
+    transcript = run_cpu_bound(cpu, local_path_transcript, path)
+    if 'error' in transcript:
+        report(progress, "local_video", "failed")
+        return transcript
+    save_checkpoint("local_transcript", transcript)
+    report(progress, "local_video", "done")
+    return transcript
+
+
+def process_local_source(path, progress=None, cpu=None, regenerate=False, tier=None):
+    # only the transcription goes through the cpu hook, so its checkpoint is written in this process
+    transcript = local_transcript(path, progress, cpu)
+    if 'error' in transcript:
+        return transcript
+    result = quiz_from_text(transcript["text"], transcript["source_name"], progress=progress, cpu=cpu,
+                            regenerate=regenerate, tier=tier)
+    if "failures" in transcript:
+        result["failures"] = transcript["failures"]
+    return result
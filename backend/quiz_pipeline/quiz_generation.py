@@ -1,123 +1,367 @@
 import re
-import google.generativeai as genai
-from dotenv import load_dotenv
-import os
+import json
 import logging
+from quiz_pipeline.gemini_client import get_gemini_client
+from quiz_pipeline.metrics import stage_timer
+from quiz_pipeline.config import QUIZ_STRUCTURED_OUTPUT, QUIZ_REPAIR_ATTEMPTS
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-def generate_quiz_with_gemini(key_points_text, num_mcq=5, num_tf=3):
-    print("\n[3/4] Generating quiz using Google Gemini API...")
-    load_dotenv()
+logger = logging.getLogger(__name__)
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        print("Error: GEMINI_API_KEY not found. Make sure it is set in your .env file.")
-        return None
-    try:
-        genai.configure(api_key=api_key)
-    except Exception as e:
-        print(f"Error configuring Gemini API: {e}")
-        return None
+GEMINI_MODEL = 'gemini-2.0-flash-lite'
+# bump when the prompt or parser changes so cached quizzes are not reused
+QUIZ_VERSION = 5
+
+MCQ_TYPE = "Multiple Choice"
+TF_TYPE = "True/False"
+OPTION_LETTERS = "ABCD"
+
+QUIZ_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "multiple_choice": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "question": {"type": "STRING"},
+                    "options": {"type": "ARRAY", "items": {"type": "STRING"}},
+                    "answer": {"type": "STRING", "enum": list(OPTION_LETTERS)},
+                },
+                "required": ["question", "options", "answer"],
+            },
+        },
+        "true_false": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "question": {"type": "STRING"},
+                    "answer": {"type": "BOOLEAN"},
+                },
+                "required": ["question", "answer"],
+            },
+        },
+    },
+    "required": ["multiple_choice", "true_false"],
+}
 
-    prompt = f"""
+_HEADER_RE = re.compile(r'^.*(Multiple Choice Questions|---.*---):?\s*', re.IGNORECASE)
+_OPTION_RE = re.compile(r'^([A-D])\.\s*(.*)$')
+_ANSWER_RE = re.compile(r'^ANSWER:\s*(.*)$', re.IGNORECASE)
+_ANSWER_LETTER_RE = re.compile(r'^\[?([A-D])\b', re.IGNORECASE)
+
+def quiz_cache_params(num_mcq=5, num_tf=3, streamed=False):
+    # a streamed quiz is generated in the text format whatever QUIZ_STRUCTURED_OUTPUT says
+    return {"version": QUIZ_VERSION, "model": GEMINI_MODEL, "num_mcq": num_mcq, "num_tf": num_tf,
+            "structured": QUIZ_STRUCTURED_OUTPUT and not streamed}
+
+def _avoid_block(avoid_questions):
+    if not avoid_questions:
+        return ""
+    listed = "\n".join(f"- {question}" for question in avoid_questions)
+    return f"\n    Do not repeat or rephrase any of these existing questions:\n{listed}\n"
+
+def _text_prompt(key_points_text, num_mcq, num_tf, avoid_questions=()):
+    return f"""
     **CRITICAL RULE: Your entire output must ONLY contain the quiz questions. Do not include any headers, titles, or separators like "Multiple Choice Questions" or "--- TRUE/FALSE ---". The output must be a seamless list of questions.**
 
     Based on the key points below, generate a quiz with the following structure:
     1.  First, generate exactly {num_mcq} multiple-choice questions. After each questions must have four options (A. , B. , C. , D. ) and an answer line formatted as "ANSWER: [LETTER]".
     2.  Immediately after the last multiple-choice question, generate exactly {num_tf} True/False questions. Each must have an answer line formatted as "ANSWER: True" or "ANSWER: False".
+    {_avoid_block(avoid_questions)}
+    **KEY POINTS TO USE FOR THE QUIZ:**
+    ---
+    {key_points_text}
+    ---
+    """
 
+def _structured_prompt(key_points_text, num_mcq, num_tf, avoid_questions=()):
+    return f"""
+    Based on the key points below, write a quiz as JSON.
+    - "multiple_choice": exactly {num_mcq} questions, each with exactly four answer options (without letter prefixes) and "answer" set to the letter (A, B, C or D) of the correct option.
+    - "true_false": exactly {num_tf} statements, each with "answer" set to true or false.
+    {_avoid_block(avoid_questions)}
     **KEY POINTS TO USE FOR THE QUIZ:**
     ---
     {key_points_text}
     ---
     """
+
+def generate_quiz_with_gemini(key_points_text, num_mcq=5, num_tf=3, avoid_questions=()):
+    print("\n[3/4] Generating quiz using Google Gemini API...")
+    client = get_gemini_client()
+    if not client.api_key:
+        print("Error: GEMINI_API_KEY not found. Make sure it is set in your .env file.")
+        return None
+
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-lite')
-        response = model.generate_content(prompt)
-        quiz_text = response.text.strip()
+        quiz_text = _request_text(client, key_points_text, num_mcq, num_tf, avoid_questions)
         print("-> Successfully received quiz from Gemini.")
         print(quiz_text)
-        return quiz_text.strip()
+        return quiz_text
 
     except Exception as e:
         print(f"An error occurred while calling the Gemini API: {e}")
         return None
 
-def parse_quiz_text(quiz_text):
-    mcq_data = []
-    tf_data = []
+def _request_text(client, key_points_text, num_mcq, num_tf, avoid_questions=()):
+    # unlike generate_quiz_with_gemini this raises, so generate_quiz can tell a failed call from a bad quiz
+    return client.generate(_text_prompt(key_points_text, num_mcq, num_tf, avoid_questions), GEMINI_MODEL).strip()
 
-    if not isinstance(quiz_text, str) or not quiz_text.strip():
-        print("Warning: Received empty or invalid text from the API.")
-        return mcq_data, tf_data
+def _mcq_item(question, options, answer_letter):
+    return {"type": MCQ_TYPE, "question": question, "options": options,
+            "answer": options[OPTION_LETTERS.index(answer_letter)]}
 
-    quiz_text = quiz_text.replace('\r\n', '\n').strip()
-    quiz_text = re.sub(r'^.*(Multiple Choice Questions|---.*---):?\s*', '', quiz_text, flags=re.IGNORECASE | re.MULTILINE)
-    quiz_text = quiz_text.strip()
+def validate_quiz_json(data):
+    # returns (mcq, tf, errors); each error names the question that was rejected and why
+    mcq_data, tf_data, errors = [], [], []
+    if not isinstance(data, dict):
+        return mcq_data, tf_data, [{"type": None, "index": None, "question": None, "reason": "response is not a JSON object"}]
 
-    question_blocks = []
-    current_block = []
-    for line in quiz_text.split('\n'):
-        stripped_line = line.strip()
-        if not stripped_line:
+    for index, item in enumerate(data.get("multiple_choice") or []):
+        question = str(item.get("question", "")).strip() if isinstance(item, dict) else ""
+        options = item.get("options") if isinstance(item, dict) else None
+        answer = str(item.get("answer", "")).strip().upper()[:1] if isinstance(item, dict) else ""
+        reason = None
+        if not question:
+            reason = "missing question text"
+        elif not isinstance(options, list) or len(options) != 4 or not all(str(o).strip() for o in options):
+            reason = "expected four non-empty options"
+        elif answer not in OPTION_LETTERS:
+            reason = f"answer '{item.get('answer')}' is not one of A-D"
+        if reason:
+            errors.append({"type": MCQ_TYPE, "index": index, "question": question or None, "reason": reason})
             continue
+        mcq_data.append(_mcq_item(question, [_OPTION_RE.sub(r'\2', str(o).strip()) for o in options], answer))
 
-        is_option = re.match(r'^[A-D]\.', stripped_line)
-        is_answer = stripped_line.upper().startswith('ANSWER:')
-        
-        if not is_option and not is_answer:
-            if current_block:
-                question_blocks.append('\n'.join(current_block))
-            current_block = [stripped_line]
+    for index, item in enumerate(data.get("true_false") or []):
+        question = str(item.get("question", "")).strip() if isinstance(item, dict) else ""
+        answer = item.get("answer") if isinstance(item, dict) else None
+        if isinstance(answer, str) and answer.strip().lower() in ("true", "false"):
+            answer = answer.strip().lower() == "true"
+        if not question:
+            errors.append({"type": TF_TYPE, "index": index, "question": None, "reason": "missing question text"})
+        elif not isinstance(answer, bool):
+            errors.append({"type": TF_TYPE, "index": index, "question": question, "reason": f"answer '{answer}' is not true/false"})
         else:
-            current_block.append(stripped_line)
+            tf_data.append({"type": TF_TYPE, "question": question, "answer": "True" if answer else "False"})
 
-    if current_block:
-        question_blocks.append('\n'.join(current_block))
+    return mcq_data, tf_data, errors
 
-    for block in question_blocks:
-        lines = [l.strip() for l in block.split('\n') if l.strip()]
-        
-        if len(lines) < 2:
-            continue
+def _finish_block(block, index):
+    # returns (item, error); stray single lines produce neither
+    question, options, answer_line = block["question"], block["options"], block["answer"]
+    if options:
+        kind = MCQ_TYPE
+        if answer_line is None:
+            reason = "missing ANSWER line"
+        else:
+            letter = _ANSWER_LETTER_RE.match(answer_line)
+            if not letter:
+                reason = f"unrecognised answer '{answer_line}'"
+            elif OPTION_LETTERS.index(letter.group(1).upper()) >= len(options):
+                reason = f"answer {letter.group(1).upper()} has no matching option"
+            else:
+                return _mcq_item(question, options, letter.group(1).upper()), None
+    else:
+        kind = TF_TYPE
+        if answer_line is None:
+            # a lone line with no options and no answer is stray prose, not a question
+            return None, None
+        upper = answer_line.upper()
+        if "TRUE" in upper:
+            return {"type": TF_TYPE, "question": question, "answer": "True"}, None
+        if "FALSE" in upper:
+            return {"type": TF_TYPE, "question": question, "answer": "False"}, None
+        reason = f"unrecognised answer '{answer_line}'"
+    return None, {"type": kind, "index": index, "question": question, "reason": reason}
+
+class QuizTextParser:
+    # incremental single-pass parser: a question line opens a block, option and ANSWER lines extend it.
+    # feed() accepts arbitrary text chunks and returns the questions completed by them.
 
-        question = lines[0]
-        answer_line = lines[-1]
-        has_mcq_options = any(re.match(r'^[A-D]\.', line) for line in lines[1:-1])
-        if has_mcq_options:
-            options = [re.sub(r'^[A-D]\.\s*', '', opt) for opt in lines[1:-1] if re.match(r'^[A-D]\.', opt)]        
-            if not options or not answer_line.upper().startswith("ANSWER:"):
-                continue            
-            try:
-                answer_match = re.search(r'ANSWER:\s*([A-D])', answer_line, flags=re.IGNORECASE)
-                if not answer_match:
-                    continue
-                
-                answer_letter = answer_match.group(1).upper()
-                answer_index = ord(answer_letter) - ord('A')
-
-                if 0 <= answer_index < len(options):
-                    answer_text = options[answer_index]
-                    mcq_data.append({
-                        "type": "Multiple Choice",
-                        "question": question,
-                        "options": options,
-                        "answer": answer_text
-                    })
-            except (IndexError, TypeError):
-                continue
+    def __init__(self):
+        self.mcq_data = []
+        self.tf_data = []
+        self.errors = []
+        self._buffer = ""
+        self._block = None
+        self._index = 0
+
+    def _close_block(self):
+        item, error = _finish_block(self._block, self._index)
+        self._block = None
+        self._index += 1
+        if error:
+            self.errors.append(error)
+        elif item:
+            (self.mcq_data if item["type"] == MCQ_TYPE else self.tf_data).append(item)
+        return item
+
+    def _feed_line(self, line):
+        line = _HEADER_RE.sub('', line, count=1).strip()
+        if not line:
+            return None
+        option = _OPTION_RE.match(line)
+        answer = _ANSWER_RE.match(line)
+        if self._block is not None and option:
+            self._block["options"].append(option.group(2))
+            self._block["answer"] = None
+        elif self._block is not None and answer:
+            self._block["answer"] = answer.group(1).strip()
         else:
-            answer = None
-            if "TRUE" in answer_line.upper():
-                answer = "True"
-            elif "FALSE" in answer_line.upper():
-                answer = "False"
-            
-            if answer:
-                tf_data.append({
-                    "type": "True/False",
-                    "question": question,
-                    "answer": answer
-                })
-
-    print(f"-> Parsed {len(mcq_data)} MCQs and {len(tf_data)} True/False questions.")
-    return mcq_data, tf_data
\ No newline at end of file
+            completed = self._close_block() if self._block is not None else None
+            self._block = {"question": line, "options": [], "answer": None}
+            return completed
+        return None
+
+    def feed(self, text):
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        completed = [self._feed_line(line) for line in lines]
+        return [item for item in completed if item]
+
+    def finish(self):
+        completed = []
+        if self._buffer:
+            completed.append(self._feed_line(self._buffer))
+            self._buffer = ""
+        if self._block is not None:
+            completed.append(self._close_block())
+        return [item for item in completed if item]
+
+def parse_quiz_text_with_errors(quiz_text):
+    if not isinstance(quiz_text, str) or not quiz_text.strip():
+        print("Warning: Received empty or invalid text from the API.")
+        return [], [], []
+
+    with stage_timer("quiz_parsing") as span:
+        parser = QuizTextParser()
+        parser.feed(quiz_text.replace('\r\n', '\n'))
+        parser.finish()
+        span["items"] = len(parser.mcq_data) + len(parser.tf_data)
+
+    print(f"-> Parsed {len(parser.mcq_data)} MCQs and {len(parser.tf_data)} True/False questions.")
+    if parser.errors:
+        print(f"-> Rejected {len(parser.errors)} malformed questions: " + "; ".join(e["reason"] for e in parser.errors))
+    return parser.mcq_data, parser.tf_data, parser.errors
+
+def parse_quiz_text(quiz_text):
+    mcq_data, tf_data, _ = parse_quiz_text_with_errors(quiz_text)
+    return mcq_data, tf_data
+
+def _stream_text_quiz(client, key_points_text, num_mcq, num_tf, on_question):
+    # parses the streamed response as it arrives so each question is handed on as soon as it is complete
+    parser = QuizTextParser()
+    for chunk in client.stream(_text_prompt(key_points_text, num_mcq, num_tf), GEMINI_MODEL):
+        for item in parser.feed(chunk.replace('\r', '')):
+            on_question(item)
+    for item in parser.finish():
+        on_question(item)
+    return parser.mcq_data, parser.tf_data, parser.errors
+
+def _request_structured(client, key_points_text, num_mcq, num_tf, avoid_questions=()):
+    prompt = _structured_prompt(key_points_text, num_mcq, num_tf, avoid_questions)
+    generation_config = {"responseMimeType": "application/json", "responseSchema": QUIZ_RESPONSE_SCHEMA}
+    raw = client.generate(prompt, GEMINI_MODEL, generation_config=generation_config)
+    with stage_timer("quiz_parsing") as span:
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return [], [], [{"type": None, "index": None, "question": None, "reason": "response was not valid JSON"}]
+        mcq_data, tf_data, errors = validate_quiz_json(data)
+        span["items"] = len(mcq_data) + len(tf_data)
+    return mcq_data, tf_data, errors
+
+def generate_quiz(key_points_text, num_mcq=5, num_tf=3, structured=None, max_repairs=None, on_question=None,
+                  is_novel=None):
+    # returns (mcq, tf, errors); only the questions that failed validation are requested again.
+    # with on_question the response is streamed and every accepted question is reported as it arrives; the
+    # stream is plain text, so its repairs are requested in the text format too.
+    # is_novel(item) is asked before a question takes a slot, so duplicates are rejected and requested again.
+    structured = (QUIZ_STRUCTURED_OUTPUT if structured is None else structured) and on_question is None
+    max_repairs = QUIZ_REPAIR_ATTEMPTS if max_repairs is None else max_repairs
+
+    client = get_gemini_client()
+    if not client.api_key:
+        print("Error: GEMINI_API_KEY not found. Make sure it is set in your .env file.")
+        return [], [], []
+
+    mcq_data, tf_data, all_errors = [], [], []
+
+    def take(item, attempt):
+        # returns (accepted, error); a question only counts once it has a free slot and is not a duplicate
+        target, limit = (mcq_data, num_mcq) if item["type"] == MCQ_TYPE else (tf_data, num_tf)
+        if len(target) >= limit:
+            return False, None
+        if is_novel is not None and not is_novel(item):
+            return False, {"type": item["type"], "index": None, "question": item["question"],
+                           "reason": "duplicate of an accepted question", "attempt": attempt}
+        target.append(item)
+        if on_question is not None:
+            on_question(item)
+        return True, None
+
+    def accept(mcq, tf, errors, attempt):
+        for item in mcq + tf:
+            _, error = take(item, attempt)
+            if error:
+                errors.append(error)
+        for error in errors:
+            error["attempt"] = attempt
+        all_errors.extend(errors)
+        if errors:
+            logger.info(f"-> {len(errors)} questions failed validation on attempt {attempt + 1}: "
+                        + "; ".join(error["reason"] for error in errors))
+
+    def request(num_mcq, num_tf, avoid_questions=()):
+        if structured:
+            return _request_structured(client, key_points_text, num_mcq, num_tf, avoid_questions)
+        return parse_quiz_text_with_errors(_request_text(client, key_points_text, num_mcq, num_tf, avoid_questions))
+
+    print("\n[3/4] Generating quiz using Google Gemini API...")
+    # the client already retries transient failures, so an exception here (http error, quota) would only
+    # repeat on every repair round; once a call fails the repair rounds are skipped
+    call_failed = False
+    try:
+        if on_question is not None:
+            duplicates = []
+
+            def on_streamed(item):
+                # accepted straight away so a stream that breaks midway keeps what was already delivered
+                _, error = take(item, 0)
+                if error:
+                    duplicates.append(error)
+
+            _, _, errors = _stream_text_quiz(client, key_points_text, num_mcq, num_tf, on_streamed)
+            accept([], [], errors + duplicates, 0)
+        else:
+            accept(*request(num_mcq, num_tf), 0)
+    except Exception as e:
+        print(f"An error occurred while calling the Gemini API: {e}")
+        call_failed = True
+
+    for attempt in range(1, max_repairs + 1):
+        need_mcq, need_tf = num_mcq - len(mcq_data), num_tf - len(tf_data)
+        if call_failed or (need_mcq <= 0 and need_tf <= 0):
+            break
+        # the repair prompt lists what was accepted so far, in either format, so it is not asked for again
+        existing = [item["question"] for item in mcq_data + tf_data]
+        try:
+            result = request(max(need_mcq, 0), max(need_tf, 0), existing)
+        except Exception as e:
+            print(f"An error occurred while calling the Gemini API: {e}")
+            call_failed = True
+            break
+        accept(*result, attempt)
+
+    if structured and not mcq_data and not tf_data:
+        # the schema route produced nothing usable (or its request failed), fall back to the plain-text format
+        try:
+            accept(*parse_quiz_text_with_errors(_request_text(client, key_points_text, num_mcq, num_tf)),
+                   max_repairs + 1)
+        except Exception as e:
+            print(f"An error occurred while calling the Gemini API: {e}")
+
+    print(f"-> Generated {len(mcq_data)} MCQs and {len(tf_data)} True/False questions.")
+    return mcq_data, tf_data, all_errors
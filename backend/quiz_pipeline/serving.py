@@ -0,0 +1,30 @@
+import os
+import sys
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def threads_per_worker(workers, requested=0, cores=None):
+    # split the cores (by default all of them) between worker processes instead of letting each one grab all
+    if requested > 0:
+        return requested
+    return max(1, (cores or os.cpu_count() or 1) // max(1, workers))
+
+
+def thread_budget():
+    # the threads this process may use: its share from limit_threads (e.g. in a gunicorn worker), else every core
+    value = os.environ.get(THREAD_ENV_VARS[0], "")
+    if value.isdigit() and int(value) > 0:
+        return int(value)
+    return os.cpu_count() or 1
+
+
+def limit_threads(num_threads):
+    # the env vars cover libraries imported later, torch needs the explicit call once it is loaded
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(num_threads)
+    # the fast tokenizers' own thread pool is not fork-safe
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(num_threads)
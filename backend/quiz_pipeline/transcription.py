@@ -1,10 +1,255 @@
-import whisper
-def transcribe_audio(audio_path, model):
+import logging
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from quiz_pipeline.config import (WHISPER_MODEL_SIZE, WHISPER_COMPUTE_TYPE, WHISPER_DEVICE, WHISPER_NUM_THREADS,
+                                  TRANSCRIBE_VAD, TRANSCRIBE_CHUNK_SECONDS, TRANSCRIBE_WORKERS,
+                                  TRANSCRIBE_PARALLEL_MIN_SECONDS, WORKER_START_METHOD)
+from quiz_pipeline.model_registry import register_model, get_model
+from quiz_pipeline.video_processing import load_audio_pcm, SAMPLE_RATE
+from quiz_pipeline.metrics import stage_timer, run_traced, merge_spans
+from quiz_pipeline.serving import threads_per_worker, thread_budget
+from quiz_pipeline.vad import detect_speech, group_segments, chunk_audio, to_source_time
+
+logger = logging.getLogger(__name__)
+
+WHISPER_MODEL = "whisper"
+
+# whisper installs kv-cache hooks on the shared model during decoding, so calls must not overlap
+_transcribe_lock = threading.Lock()
+
+
+def _quantize_int8(model):
+    import torch
+    import whisper
+    # whisper's Linear only adds a dtype cast, swap it for the stock layer so quantize_dynamic picks it up
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_whisper_model(model_size=None, compute_type=None, device=None, num_threads=None):
+    import torch
+    import whisper
+    model_size = model_size or WHISPER_MODEL_SIZE
+    compute_type = compute_type or WHISPER_COMPUTE_TYPE
+    device = device or WHISPER_DEVICE or ("cuda" if torch.cuda.is_available() else "cpu")
+    num_threads = WHISPER_NUM_THREADS if num_threads is None else num_threads
+
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+
+    if compute_type == "int8":
+        if device != "cpu":
+            raise ValueError("int8 Whisper inference is only supported on CPU.")
+        model = whisper.load_model(model_size, device="cpu")
+        model = _quantize_int8(model)
+    elif compute_type == "fp32":
+        model = whisper.load_model(model_size, device=device)
+    else:
+        raise ValueError(f"Unsupported WHISPER_COMPUTE_TYPE: {compute_type}")
+
+    model.eval()
+    print(f"-> Whisper '{model_size}' loaded ({compute_type}, {device}, {torch.get_num_threads()} threads).")
+    return model
+
+
+register_model(WHISPER_MODEL, load_whisper_model)
+
+
+def init_transcription_worker(num_threads):
+    # pool initializer: split the cores between worker processes instead of each grabbing all of them
+    import torch
+    if num_threads > 0 and WHISPER_NUM_THREADS <= 0:
+        torch.set_num_threads(num_threads)
+
+
+def transcription_cache_params():
+    params = {"model": WHISPER_MODEL_SIZE, "compute_type": WHISPER_COMPUTE_TYPE}
+    if TRANSCRIBE_VAD:
+        params["vad"] = {"chunk_seconds": TRANSCRIBE_CHUNK_SECONDS}
+    return params
+
+
+def get_whisper_model():
+    return get_model(WHISPER_MODEL)
+
+
+def _run_whisper(model, audio):
+    # returns [{start, end, text}] relative to the start of audio
+    with _transcribe_lock, stage_timer("whisper") as span:
+        # fp16 decoding is only available on GPU
+        result = model.transcribe(audio, fp16=model.device.type != "cpu")
+        span["items"] = len(result.get('segments', []))
+    return [{"start": segment['start'], "end": segment['end'], "text": segment['text'].strip()}
+            for segment in result.get('segments', [])]
+
+
+def _transcribe_chunk(audio):
+    # runs in a pool worker, which loads its own model once and keeps it for later chunks
+    return _run_whisper(get_whisper_model(), audio)
+
+
+_pool = None
+_pool_size = None
+_pool_users = {}
+_pool_lock = threading.Lock()
+
+
+def _reset_pool():
+    global _pool, _pool_size, _pool_users, _pool_lock
+    _pool = None
+    _pool_size = None
+    _pool_users = {}
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pool)
+
+
+def _release_if_idle(pool):
+    # caller holds _pool_lock; a pool that is no longer current shuts down once its last user lets go
+    if not _pool_users.get(pool):
+        _pool_users.pop(pool, None)
+        pool.shutdown(wait=False)
+
+
+@contextmanager
+def transcription_pool(workers):
+    # one persistent pool per process: its workers load whisper once and keep it for every later request.
+    # the pool always has exactly `workers` processes, each with its share of this process's thread budget;
+    # asking for another size replaces it, and the old pool finishes the work already handed to it
+    global _pool, _pool_size
+    size = (workers, threads_per_worker(workers, cores=thread_budget()))
+    with _pool_lock:
+        if _pool is not None and _pool_size != size:
+            replaced, _pool = _pool, None
+            _release_if_idle(replaced)
+        if _pool is None:
+            context = multiprocessing.get_context(WORKER_START_METHOD) if WORKER_START_METHOD else None
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                        initializer=init_transcription_worker, initargs=(size[1],))
+            _pool_size = size
+        pool = _pool
+        _pool_users[pool] = _pool_users.get(pool, 0) + 1
     try:
+        yield pool
+    finally:
+        with _pool_lock:
+            _pool_users[pool] -= 1
+            if pool is not _pool:
+                _release_if_idle(pool)
+
+
+def discard_transcription_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _chunk_workers(chunk_count, speech_seconds, workers):
+    # the size of the pool the chunks run in; it does not shrink with the chunk count, so requests of different
+    # lengths keep reusing the same pool
+    if chunk_count < 2:
+        return 1
+    if workers is None:
+        if speech_seconds < TRANSCRIBE_PARALLEL_MIN_SECONDS:
+            return 1
+        # half of this process's thread budget, so n gunicorn workers do not each fan out over every core
+        workers = TRANSCRIBE_WORKERS or max(1, thread_budget() // 2)
+    return max(1, workers)
+
+
+def _transcribe_chunks_parallel(audio, chunks, workers):
+    # yields the chunk results in order, keeping only a few chunks per pool worker in flight so their copies
+    # stay small
+    with transcription_pool(workers) as pool:
+        window = pool._max_workers * 2
+        try:
+            pending = [pool.submit(run_traced, _transcribe_chunk, chunk_audio(audio, chunk))
+                       for chunk in chunks[:window]]
+            next_chunk = window
+            while pending:
+                segments, spans = pending.pop(0).result()
+                merge_spans(spans)
+                if next_chunk < len(chunks):
+                    pending.append(pool.submit(run_traced, _transcribe_chunk, chunk_audio(audio, chunks[next_chunk])))
+                    next_chunk += 1
+                yield segments
+        except Exception:
+            # a dead worker (usually OOM) breaks the whole pool; the next call starts a fresh one
+            discard_transcription_pool(pool)
+            raise
+
+
+def _chunk_results(audio, chunks, workers, model):
+    done = 0
+    if workers > 1:
+        try:
+            for segments in _transcribe_chunks_parallel(audio, chunks, workers):
+                yield segments
+                done += 1
+            return
+        except Exception as e:
+            logger.warning(f"Parallel transcription failed, continuing in-process: {e}")
+    model = model or get_whisper_model()
+    for chunk in chunks[done:]:
+        yield _run_whisper(model, chunk_audio(audio, chunk))
+
+
+def transcribe_audio_segments(audio, model=None, on_segment=None, vad=None, workers=None):
+    # returns {"text", "segments"} with timestamps in seconds from the start of the recording.
+    # with vad, silence is dropped and the speech is transcribed in chunks, across worker processes for long
+    # recordings; an explicit model or workers=1 keeps everything in this process
+    if isinstance(audio, str):
+        audio = load_audio_pcm(audio)
+    vad = TRANSCRIBE_VAD if vad is None else vad
+
+    if not vad:
         print("--> Transcribing audio...")
-        result = model.transcribe(audio_path)
+        segments = _run_whisper(model or get_whisper_model(), audio)
+        for segment in segments if on_segment is not None else []:
+            on_segment(segment)
+        return {"text": " ".join(segment["text"] for segment in segments if segment["text"]), "segments": segments}
+
+    with stage_timer("vad") as span:
+        chunks = group_segments(detect_speech(audio, SAMPLE_RATE), SAMPLE_RATE, TRANSCRIBE_CHUNK_SECONDS, audio=audio)
+        span["items"] = len(chunks)
+    speech_seconds = sum(end - start for chunk in chunks for start, end in chunk) / SAMPLE_RATE
+    workers = 1 if model is not None else _chunk_workers(len(chunks), speech_seconds, workers)
+    print(f"--> Transcribing {speech_seconds:.0f}s of speech in {len(chunks)} chunks with {workers} workers "
+          f"({len(audio) / SAMPLE_RATE - speech_seconds:.0f}s of silence skipped)...")
+
+    segments = []
+    for chunk, chunk_segments in zip(chunks, _chunk_results(audio, chunks, workers, model)):
+        for segment in chunk_segments:
+            segment = {"start": round(float(to_source_time(chunk, segment["start"], SAMPLE_RATE)), 2),
+                       "end": round(float(to_source_time(chunk, segment["end"], SAMPLE_RATE)), 2),
+                       "text": segment["text"]}
+            segments.append(segment)
+            if on_segment is not None:
+                on_segment(segment)
+    return {"text": " ".join(segment["text"] for segment in segments if segment["text"]), "segments": segments}
+
+
+def transcribe_audio_timed(audio, model=None, on_segment=None, workers=None):
+    # like transcribe_audio, but returns {"text", "segments"} so the timestamps can be kept; None on failure
+    try:
+        result = transcribe_audio_segments(audio, model=model, on_segment=on_segment, workers=workers)
         print("---> Transcription successful.")
-        return result['text']
+        return result
     except Exception as e:
         print(f"Error during transcription: {e}")
-        return ""
+        return None
+
+
+def transcribe_audio(audio, model=None, on_segment=None, workers=None):
+    # audio is a media file path (decoded to PCM here) or a 16 kHz mono float32 array
+    result = transcribe_audio_timed(audio, model=model, on_segment=on_segment, workers=workers)
+    return result["text"] if result else ""
@@ -0,0 +1,107 @@
+import numpy as np
+
+# energy-based voice activity detection: cheap enough to run on hours of audio in a few hundred milliseconds,
+# and only used to skip silence and to find safe places to cut, not to judge what is speech in detail
+
+
+def frame_energies(audio, sample_rate, frame_ms=30):
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    count = len(audio) // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32), frame
+    frames = audio[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+    return 20 * np.log10(rms + 1e-10), frame
+
+
+def detect_speech(audio, sample_rate, frame_ms=30, margin_db=12.0, floor_db=-50.0, min_speech=0.25,
+                  min_silence=0.6, pad=0.3):
+    # returns [(start_sample, end_sample)] of speech; the threshold sits margin_db above the noise floor,
+    # but never closer than margin_db to the loud frames, so recordings with hardly any silence keep their speech
+    energies, frame = frame_energies(audio, sample_rate, frame_ms)
+    if not len(energies):
+        return []
+    noise_floor, speech_level = np.percentile(energies, [10, 90])
+    threshold = max(min(noise_floor + margin_db, speech_level - margin_db), floor_db)
+    voiced = energies > threshold
+
+    segments = []
+    start = None
+    for index, is_voiced in enumerate(voiced):
+        if is_voiced and start is None:
+            start = index
+        elif not is_voiced and start is not None:
+            segments.append([start, index])
+            start = None
+    if start is not None:
+        segments.append([start, len(voiced)])
+
+    # bridge short pauses, then drop blips that are too short to hold a word
+    frames_per_second = 1000 / frame_ms
+    merged = []
+    for segment in segments:
+        if merged and segment[0] - merged[-1][1] < min_silence * frames_per_second:
+            merged[-1][1] = segment[1]
+        else:
+            merged.append(segment)
+    merged = [segment for segment in merged if segment[1] - segment[0] >= min_speech * frames_per_second]
+
+    pad_samples = int(pad * sample_rate)
+    result = []
+    for start_frame, end_frame in merged:
+        start_sample = max(0, start_frame * frame - pad_samples)
+        end_sample = min(len(audio), end_frame * frame + pad_samples)
+        if result and start_sample <= result[-1][1]:
+            result[-1] = (result[-1][0], end_sample)
+        else:
+            result.append((start_sample, end_sample))
+    return result
+
+
+def _quiet_cut(audio, start, limit, sample_rate, search_seconds=2.0, frame_ms=30):
+    # the middle of the quietest frame in the last search_seconds before limit, so the cut falls between words
+    search_start = max(start + 1, limit - int(search_seconds * sample_rate))
+    energies, frame = frame_energies(audio[search_start:limit], sample_rate, frame_ms)
+    if not len(energies):
+        return limit
+    return search_start + int(np.argmin(energies)) * frame + frame // 2
+
+
+def group_segments(segments, sample_rate, max_seconds=60.0, audio=None):
+    # packs consecutive speech segments into chunks holding at most max_seconds of speech; a segment longer
+    # than that on its own is cut into pieces, at the quietest moment before the limit when audio is given
+    max_samples = int(max_seconds * sample_rate)
+    chunks, current, current_samples = [], [], 0
+    for start, end in segments:
+        while end - start > max_samples:
+            if current:
+                chunks.append(current)
+                current, current_samples = [], 0
+            cut = start + max_samples
+            if audio is not None:
+                cut = _quiet_cut(audio, start, cut, sample_rate)
+            chunks.append([(start, cut)])
+            start = cut
+        if current and current_samples + end - start > max_samples:
+            chunks.append(current)
+            current, current_samples = [], 0
+        current.append((start, end))
+        current_samples += end - start
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_audio(audio, chunk):
+    # the speech of a chunk with the silences between its segments removed
+    return np.concatenate([audio[start:end] for start, end in chunk])
+
+
+def to_source_time(chunk, seconds, sample_rate):
+    # maps a timestamp inside the concatenated chunk back to the position in the original recording
+    offset = seconds * sample_rate
+    for start, end in chunk:
+        if offset <= end - start:
+            return (start + offset) / sample_rate
+        offset -= end - start
+    return chunk[-1][1] / sample_rate
@@ -1,39 +1,57 @@
 import os
-import yt_dlp
-from moviepy import VideoFileClip
+import subprocess
+import numpy as np
 import logging 
+from quiz_pipeline.metrics import stage_timer
 
-def extract_audio_from_local_video(video_path, audio_output_path):
+# whisper models expect 16 kHz mono input
+SAMPLE_RATE = 16000
+
+def load_audio_pcm(source, sample_rate=SAMPLE_RATE):
+    # decode the audio track of any container straight to float32 PCM in a single ffmpeg pass
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", source,
+        "-vn", "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-",
+    ]
+    try:
+        with stage_timer("audio_decode"):
+            out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg was not found on PATH.")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='ignore').strip()[-500:]}") from e
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+def extract_audio_from_local_video(video_path):
     try:
-        print(f"-> Loading video: {os.path.basename(video_path)}")
-        video_clip = VideoFileClip(video_path)
-        print("--> Extracting audio...")
-        audio_clip = video_clip.audio
-        audio_clip.write_audiofile(audio_output_path, codec='mp3', logger=None)
-        audio_clip.close()
-        video_clip.close()
-        print("---> Audio extraction successful.")
-        return audio_output_path
+        print(f"-> Decoding audio from: {os.path.basename(video_path)}")
+        audio = load_audio_pcm(video_path)
+        print(f"---> Audio extraction successful ({len(audio) / SAMPLE_RATE:.0f}s).")
+        return audio
     except Exception as e:
         print(f"Error processing local video: {e}")
         return None
 
-def extract_audio_from_url(video_url, audio_output_path="temp_audio.mp3"):
+def extract_audio_from_url(video_url, output_dir="."):
+    # keeps the source's native audio stream, whisper decodes it directly so nothing is re-encoded
+    import yt_dlp
     try:
         print(f"-> Connecting to URL: {video_url}")
         ydl_opts = {
             'format': 'bestaudio/best',
-            'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '192'}],
-            'outtmpl': audio_output_path.replace('.mp3', '')
+            'outtmpl': os.path.join(output_dir, '%(id)s.%(ext)s'),
+            'quiet': True,
+            'noprogress': True,
         }
-        print("--> Downloading and extracting audio...")
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([video_url])
-        final_path = audio_output_path
+        print("--> Downloading audio...")
+        with stage_timer("audio_download"), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(video_url, download=True)
+            final_path = ydl.prepare_filename(info)
         if not os.path.exists(final_path):
-             final_path = audio_output_path.replace('.mp3', '.mp3')
-        print("---> Audio extraction successful.")
+            print(f"Error processing URL: downloaded file not found at {final_path}")
+            return None
+        print("---> Audio download successful.")
         return final_path
     except Exception as e:
         print(f"Error processing URL: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,73 @@
+"""Download and load models ahead of time.
+
+Run from the backend directory, e.g. during an image build or before starting workers:
+
+    python -m quiz_pipeline.warmup all --download-only
+    python -m quiz_pipeline.warmup keypoints
+    python -m quiz_pipeline.warmup whisper spacy
+
+With KEYPOINT_BACKEND=onnx, --download-only also exports the transformers to ONNX_EXPORT_DIR.
+"""
+import argparse
+import sys
+import time
+from quiz_pipeline.model_registry import registry
+from quiz_pipeline.transcription import WHISPER_MODEL
+from quiz_pipeline.keypoint_extraction import KEYPOINT_MODELS, FAST_KEYPOINT_MODELS
+
+MODEL_GROUPS = {
+    "transcription": [WHISPER_MODEL],
+    "keypoints": KEYPOINT_MODELS,
+    "fast_keypoints": FAST_KEYPOINT_MODELS,
+}
+
+
+def expand(names):
+    if not names or "all" in names:
+        return registry.names()
+    expanded = []
+    for name in names:
+        for model in MODEL_GROUPS.get(name, [name]):
+            if model not in expanded:
+                expanded.append(model)
+    return expanded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-download and pre-load pipeline models.")
+    parser.add_argument("models", nargs="*", default=["all"],
+                        help=f"model names, groups ({', '.join(MODEL_GROUPS)}) or 'all'")
+    parser.add_argument("--download-only", action="store_true", help="fetch the weights without loading them")
+    parser.add_argument("--list", action="store_true", help="print the known model names and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in registry.names():
+            print(name)
+        for group, models in MODEL_GROUPS.items():
+            print(f"{group}: {', '.join(models)}")
+        return 0
+
+    names = expand(args.models)
+    unknown = [name for name in names if name not in registry.names()]
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(unknown)}")
+
+    failed = 0
+    for name in names:
+        started = time.perf_counter()
+        try:
+            if args.download_only:
+                registry.download(name)
+            else:
+                registry.get(name)
+        except Exception as e:
+            failed += 1
+            print(f"x {name}: {e}")
+            continue
+        print(f"-> {name} {'downloaded' if args.download_only else 'loaded'} in {time.perf_counter() - started:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
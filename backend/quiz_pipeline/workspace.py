@@ -0,0 +1,211 @@
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from quiz_pipeline.config import WORKSPACE_DIR, WORKSPACE_TTL
+
+logger = logging.getLogger(__name__)
+
+# every run gets a private directory under WORKSPACE_DIR for its downloads, uploads and stage checkpoints.
+# a checkpoint is the output of a finished stage; when a failed job is retried the stages that already have
+# one are skipped, whatever the shared cache has evicted in the meantime (or with CACHE_ENABLED=false).
+
+
+class Workspace:
+
+    def __init__(self, path, checkpoints=True):
+        self.path = path
+        self.id = os.path.basename(path)
+        # without checkpoints the workspace only holds scratch files, for runs that can never be retried
+        self.checkpoints = checkpoints
+
+    @classmethod
+    def create(cls, workspace_id=None, root=WORKSPACE_DIR, checkpoints=True):
+        path = os.path.join(root, workspace_id or uuid.uuid4().hex)
+        os.makedirs(path, exist_ok=True)
+        return cls(path, checkpoints=checkpoints)
+
+    @classmethod
+    def find(cls, workspace_id, root=WORKSPACE_DIR):
+        # an existing workspace, e.g. one created by another worker process; None for unknown or unsafe ids
+        if not workspace_id or workspace_id.startswith('.') or os.path.basename(workspace_id) != workspace_id:
+            return None
+        path = os.path.join(root, workspace_id)
+        return cls(path) if os.path.isdir(path) else None
+
+    def subdir(self, name):
+        path = os.path.join(self.path, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def child(self, name):
+        # batch items checkpoint into their own sub-workspace so their stages do not collide
+        return Workspace(self.subdir(name), checkpoints=self.checkpoints)
+
+    def _checkpoint_path(self, stage):
+        return os.path.join(self.path, "checkpoints", f"{stage}.json")
+
+    def load(self, stage):
+        if not self.checkpoints:
+            return None
+        return _read_json(self._checkpoint_path(stage))
+
+    def save(self, stage, value):
+        if not self.checkpoints:
+            return
+        try:
+            self.subdir("checkpoints")
+            _write_json(self._checkpoint_path(stage), value)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write checkpoint {self.id}/{stage}: {e}")
+
+    def read_file(self, name):
+        # a json file directly in the workspace (e.g. a job record), None when missing or unreadable
+        return _read_json(os.path.join(self.path, name))
+
+    def write_file(self, name, value):
+        # replaced atomically, so a reader in another process never sees a half-written file
+        _write_json(os.path.join(self.path, name), value)
+
+    def completed_stages(self):
+        # stage names, prefixed with the child workspace they belong to (e.g. "source-1/keypoints")
+        stages = []
+        for dirpath, _, filenames in os.walk(self.path):
+            if os.path.basename(dirpath) != "checkpoints":
+                continue
+            prefix = os.path.relpath(os.path.dirname(dirpath), self.path)
+            for name in filenames:
+                if name.endswith('.json'):
+                    stages.append(name[:-5] if prefix == "." else f"{prefix}/{name[:-5]}")
+        return sorted(stages)
+
+    def remove(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def clear(self, keep=()):
+        # drops everything but the named entries, e.g. a finished job keeps only its record
+        for name in os.listdir(self.path) if os.path.isdir(self.path) else []:
+            if name in keep:
+                continue
+            path = os.path.join(self.path, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, value):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+_current_workspace = contextvars.ContextVar("quiz_workspace", default=None)
+
+
+def current_workspace():
+    return _current_workspace.get()
+
+
+@contextlib.contextmanager
+def use_workspace(workspace):
+    token = _current_workspace.set(workspace)
+    try:
+        yield workspace
+    finally:
+        _current_workspace.reset(token)
+
+
+@contextlib.contextmanager
+def child_workspace(name):
+    workspace = current_workspace()
+    with use_workspace(workspace.child(name) if workspace is not None else None) as child:
+        yield child
+
+
+@contextlib.contextmanager
+def ephemeral_workspace():
+    # for runs that cannot be retried (synchronous and streaming requests): scratch files only, no checkpoints,
+    # removed at the end
+    workspace = Workspace.create(checkpoints=False)
+    try:
+        with use_workspace(workspace):
+            yield workspace
+    finally:
+        workspace.remove()
+
+
+def load_checkpoint(stage):
+    workspace = current_workspace()
+    return workspace.load(stage) if workspace is not None else None
+
+
+def save_checkpoint(stage, value):
+    workspace = current_workspace()
+    if workspace is not None:
+        workspace.save(stage, value)
+
+
+@contextlib.contextmanager
+def scratch_dir(name):
+    # inside a workspace the directory survives a failure so a retry can reuse what was downloaded;
+    # without one it is a temp dir removed on exit
+    workspace = current_workspace()
+    if workspace is None:
+        with tempfile.TemporaryDirectory(prefix=f"quiz_{name}_") as path:
+            yield path
+    else:
+        yield workspace.subdir(name)
+
+
+def discard_scratch_dir(path):
+    # called once the stage that needed the files has its checkpoint
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def sweep_workspaces(max_age=WORKSPACE_TTL, keep=(), root=WORKSPACE_DIR):
+    # removes workspaces nobody touched for max_age seconds, e.g. left behind by a crashed or recycled worker
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name in keep or not os.path.isdir(path):
+            continue
+        try:
+            last_used = max([os.path.getmtime(path)] + [os.path.getmtime(os.path.join(dirpath, entry))
+                                                        for dirpath, dirnames, filenames in os.walk(path)
+                                                        for entry in dirnames + filenames])
+        except OSError:
+            continue
+        if last_used < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"Removed {removed} stale workspace(s) from {root}.")
+    return removed
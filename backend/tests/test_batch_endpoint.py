@@ -0,0 +1,12 @@
+from backend_app import app
+
+
+def test_batch_rejects_a_json_list_body():
+    response = app.test_client().post('/api/generate-quiz/batch', json=["https://example.com/video"])
+    assert response.status_code == 400
+    assert "'sources' list" in response.get_json()["error"]
+
+
+def test_batch_rejects_a_body_without_sources():
+    response = app.test_client().post('/api/generate-quiz/batch', json={"source": "https://example.com/video"})
+    assert response.status_code == 400
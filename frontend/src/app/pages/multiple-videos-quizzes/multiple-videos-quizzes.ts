@@ -3,7 +3,7 @@ import { CommonModule } from '@angular/common';
 import { Router } from '@angular/router';
 
 // ✅ 1. Import the necessary services
-import { ApiService } from '../../services/api'; 
+import { ApiService, QuizStreamEvent, STAGE_MESSAGES } from '../../services/api';
 import { QuizStateService } from '../../services/quiz-state.service';
 
 @Component({
@@ -17,6 +17,7 @@ export class MultipleVideosQuizzes implements OnInit {
   quiz: any[] = [];
   source: string = 'Unknown Source';
   isLoading: boolean = false; // For the loading indicator
+  stageMessage: string = '';
 
   constructor(
     private router: Router,
@@ -46,39 +47,47 @@ export class MultipleVideosQuizzes implements OnInit {
    * ✅ 3. New method to handle quiz regeneration
    */
   regenerateQuiz(): void {
-    this.isLoading = true; // Show loading spinner
-    this.quiz = []; // Clear the current quiz to show the loading message
-
-    this.apiService.generateQuizFromVideo(this.source).subscribe({
-      next: (response: any[]) => {
-        // The API returns an array, but for a single link, it will have one item.
-        const newQuizData = response[0]?.quiz_data;
-
-        if (newQuizData) {
-          // Update the quiz on this page immediately
-          this.quiz = newQuizData;
-
-          // Find and update the quiz in the shared state service
-          const itemIndex = this.quizStateService.generatedItems.findIndex(
-            item => item.source === this.source
-          );
-          if (itemIndex > -1) {
-            this.quizStateService.generatedItems[itemIndex].quiz = newQuizData;
-          }
-        } else {
-          // Handle case where regeneration fails
-          alert('Failed to regenerate the quiz. Please try again.');
-        }
-        
-        this.isLoading = false; // Hide loading spinner
-      },
+    this.isLoading = true;
+    this.quiz = [];
+    this.stageMessage = 'Starting...';
+    // Questions are shown as soon as the server accepts them instead of after the whole quiz is done
+    this.apiService.streamQuiz({ source: this.source, regenerate: true }).subscribe({
+      next: (message: QuizStreamEvent) => this.onStreamEvent(message),
       error: (err) => {
         this.isLoading = false;
-        alert(`An error occurred: ${err.error?.error || 'Unknown error'}`);
+        alert(`An error occurred: ${err?.error || err?.message || 'Unknown error'}`);
+      },
+      complete: () => {
+        this.isLoading = false;
       }
     });
   }
 
+  private onStreamEvent({ event, data }: QuizStreamEvent): void {
+    if (event === 'stage') {
+      this.stageMessage = STAGE_MESSAGES[data.stage] || this.stageMessage;
+    } else if (event === 'item' && data.stage === 'quiz_generation') {
+      this.quiz = [...this.quiz, data.question];
+    } else if (event === 'result') {
+      const newQuizData = data[0]?.quiz_data;
+      if (newQuizData) {
+        // The final quiz replaces the streamed questions
+        this.quiz = newQuizData;
+        // Update the quiz in the shared state service
+        const itemIndex = this.quizStateService.generatedItems.findIndex(
+          item => item.source === this.source
+        );
+        if (itemIndex > -1) {
+          this.quizStateService.generatedItems[itemIndex].quiz = newQuizData;
+        }
+      } else {
+        alert('Failed to regenerate the quiz.');
+      }
+    } else if (event === 'error') {
+      alert(`An error occurred: ${data.error || 'Unknown error'}`);
+    }
+  }
+
   // --- Helper methods (getOptionLetter, getCorrectAnswerLetter) remain unchanged ---
   getOptionLetter(index: number): string {
     return String.fromCharCode(65 + index);
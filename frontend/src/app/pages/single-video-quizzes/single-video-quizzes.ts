@@ -4,7 +4,7 @@ import { FormsModule } from '@angular/forms';
 import { Router } from '@angular/router';
 
 // ✅ 1. Import services
-import { ApiService } from '../../services/api';
+import { ApiService, QuizStreamEvent, STAGE_MESSAGES } from '../../services/api';
 import { QuizStateService } from '../../services/quiz-state.service';
 
 @Component({
@@ -19,6 +19,7 @@ export class SingleVideoQuizzes implements OnInit {
   // ✅ Add properties for source and loading state
   source: string = 'Unknown Source';
   isLoading: boolean = false;
+  stageMessage: string = '';
 
   constructor(
     private router: Router,
@@ -52,31 +53,45 @@ export class SingleVideoQuizzes implements OnInit {
   regenerateQuiz(): void {
     this.isLoading = true;
     this.quiz = [];
-
-    this.apiService.generateQuizFromVideo(this.source).subscribe({
-      next: (response: any[]) => {
-        const newQuizData = response[0]?.quiz_data;
-
-        if (newQuizData) {
-          this.quiz = newQuizData;
-          const itemIndex = this.quizStateService.generatedItems.findIndex(
-            item => item.source === this.source
-          );
-          if (itemIndex > -1) {
-            this.quizStateService.generatedItems[itemIndex].quiz = newQuizData;
-          }
-        } else {
-          alert('Failed to regenerate the quiz.');
-        }
+    this.stageMessage = 'Starting...';
+    // Questions are shown as soon as the server accepts them instead of after the whole quiz is done
+    this.apiService.streamQuiz({ source: this.source, regenerate: true }).subscribe({
+      next: (message: QuizStreamEvent) => this.onStreamEvent(message),
+      error: (err) => {
         this.isLoading = false;
+        alert(`An error occurred: ${err?.error || err?.message || 'Unknown error'}`);
       },
-      error: (err) => {
+      complete: () => {
         this.isLoading = false;
-        alert(`An error occurred: ${err.error?.error || 'Unknown error'}`);
       }
     });
   }
 
+  private onStreamEvent({ event, data }: QuizStreamEvent): void {
+    if (event === 'stage') {
+      this.stageMessage = STAGE_MESSAGES[data.stage] || this.stageMessage;
+    } else if (event === 'item' && data.stage === 'quiz_generation') {
+      this.quiz = [...this.quiz, data.question];
+    } else if (event === 'result') {
+      const newQuizData = data[0]?.quiz_data;
+      if (newQuizData) {
+        // The final quiz replaces the streamed questions
+        this.quiz = newQuizData;
+        // Update the quiz in the shared state service
+        const itemIndex = this.quizStateService.generatedItems.findIndex(
+          item => item.source === this.source
+        );
+        if (itemIndex > -1) {
+          this.quizStateService.generatedItems[itemIndex].quiz = newQuizData;
+        }
+      } else {
+        alert('Failed to regenerate the quiz.');
+      }
+    } else if (event === 'error') {
+      alert(`An error occurred: ${data.error || 'Unknown error'}`);
+    }
+  }
+
   // --- Helper methods remain unchanged ---
   getOptionLetter(index: number): string {
     return String.fromCharCode(65 + index);
@@ -2,6 +2,21 @@ import { Injectable } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
 import { Observable } from 'rxjs';
 
+export interface QuizStreamEvent {
+  event: string;
+  data: any;
+}
+
+// What the pages show while a streamed pipeline is in a given stage
+export const STAGE_MESSAGES: { [stage: string]: string } = {
+  download: 'Downloading the video...',
+  transcription: 'Transcribing the audio...',
+  local_video: 'Transcribing the video...',
+  pdf_extraction: 'Reading the PDF...',
+  keypoints: 'Extracting key points...',
+  quiz_generation: 'Generating questions...'
+};
+
 @Injectable({
   providedIn: 'root'
 })
@@ -10,9 +25,78 @@ export class ApiService {
 
   constructor(private http: HttpClient) {}
 
-  // Handles video URLs
-  generateQuizFromVideo(videoUrl: string): Observable<any> {
-    return this.http.post(`${this.baseUrl}/generate-quiz`, { source: videoUrl });
+  // Handles video URLs; regenerate asks the backend for a fresh quiz instead of the cached one,
+  // tier 'fast' trades key-point quality for latency (the server default applies when it is left out)
+  generateQuizFromVideo(videoUrl: string, regenerate: boolean = false, tier?: 'full' | 'fast'): Observable<any> {
+    return this.http.post(`${this.baseUrl}/generate-quiz`, { source: videoUrl, regenerate, tier });
+  }
+
+  // Streams pipeline events (stage updates, transcript segments, key points, questions) as they are produced.
+  // HttpClient buffers the whole body, so this reads the server-sent events through fetch instead.
+  streamQuiz(body: { source: string, regenerate?: boolean, tier?: 'full' | 'fast' } | FormData,
+             endpoint: string = 'generate-quiz/stream'): Observable<QuizStreamEvent> {
+    return new Observable<QuizStreamEvent>(observer => {
+      const controller = new AbortController();
+      const init: RequestInit = body instanceof FormData
+        ? { method: 'POST', body, signal: controller.signal }
+        : { method: 'POST', body: JSON.stringify(body), headers: { 'Content-Type': 'application/json' }, signal: controller.signal };
+
+      fetch(`${this.baseUrl}/${endpoint}`, init).then(async response => {
+        if (!response.ok || !response.body) {
+          observer.error(await response.json().catch(() => ({ error: `HTTP ${response.status}` })));
+          return;
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          let boundary;
+          while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let data = '';
+            for (const line of block.split('\n')) {
+              if (line.startsWith('event:')) event = line.slice(6).trim();
+              else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            if (!data) continue; // keep-alive comment
+            observer.next({ event, data: JSON.parse(data) });
+            if (event === 'done') {
+              observer.complete();
+              return;
+            }
+          }
+        }
+        observer.complete();
+      }).catch(err => {
+        if (!controller.signal.aborted) observer.error(err);
+      });
+
+      return () => controller.abort();
+    });
+  }
+
+  // Many URLs, server paths and PDFs at once; resolves to { results: [...] } in the order the sources were given
+  generateQuizBatch(sources: string[], files: File[] = [], regenerate: boolean = false): Observable<any> {
+    return this.http.post(`${this.baseUrl}/generate-quiz/batch`, this.batchForm(sources, files, regenerate));
+  }
+
+  // Same batch as a stream: every source's result arrives as an 'item' event with stage 'batch' as soon as
+  // it completes, stage events carry the indices of the sources they belong to
+  streamQuizBatch(sources: string[], files: File[] = [], regenerate: boolean = false): Observable<QuizStreamEvent> {
+    return this.streamQuiz(this.batchForm(sources, files, regenerate), 'generate-quiz/batch?stream=1');
+  }
+
+  private batchForm(sources: string[], files: File[], regenerate: boolean): FormData {
+    const form = new FormData();
+    sources.forEach(source => form.append('sources', source));
+    files.forEach(file => form.append('files', file, file.name));
+    form.append('regenerate', String(regenerate));
+    return form;
   }
 
   // Handles PDF file uploads